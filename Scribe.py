@@ -1,40 +1,6 @@
 import streamlit as st
-from st_supabase_connection import SupabaseConnection
 from components.available_credits import display_credits
-
-# Initialize Supabase connection
-conn = st.connection("supabase", type=SupabaseConnection)
-
-def initialize_user_prompt(user_email):
-    try:
-        # Check if user has a prompt
-        response = conn.table("prompts").select("*").eq("email", user_email).execute()
-        
-        # If no prompt exists, create default one
-        if not response.data:
-            default_prompt = """Given medical notes or transcription, produce a concise summary in standard medical format:
-- No duplication of information between sections.
-- All lab results must only appear in the "Labs" section.
-- All future actions/items must be included in the "Action Plan" section.
-
-**Sections:**
-- **CC**: Reason for visit/consultation
-- **HPI**: Patient complaints, history, context
-- **Treatments Tried**: List
-- **Physical Exam**: List
-- **Labs**: All laboratory results
-- **Imaging**: List
-- **Diagnosis/Impression**: List
-- **Action Plan**: List"""
-            
-            data = {
-                "prompt": default_prompt,
-                "email": user_email
-            }
-            conn.table("prompts").insert(data).execute()
-            
-    except Exception as e:
-        st.error(f"Error initializing user prompt: {str(e)}")
+from components.user_session import bootstrap_user_session
 
 # Authentication check
 user_info = st.experimental_user
@@ -48,7 +14,7 @@ if not user_info or not user_info.is_logged_in:
     
     #### 🔒 Privacy & Security
     * HIPAA compliant processing
-    * No data storage - everything stays on your device
+    * Recordings are never saved - summaries and transcripts are deleted from the server about an hour after they are ready, and are never kept in usage logs
     * Secure AI processing for medical documentation
     
     #### ✨ Core Features
@@ -67,9 +33,8 @@ if not user_info or not user_info.is_logged_in:
         st.login(provider="google")
     
 else:
-    # Initialize user prompt if logged in
-    if user_info.email:
-        initialize_user_prompt(user_info.email)
+    # Create the user's profile on first login and load it once per session
+    user_session = bootstrap_user_session()
     
     # Add logout button in top right
     _, _, _, logout_col = st.columns([1, 1, 1, 0.5])
@@ -80,8 +45,8 @@ else:
     st.header("🏥 MedDor Notes", divider="grey")
     
     # Display credits
-    if user_info.email:
-        display_credits(user_info.email)
+    if user_session:
+        display_credits(user_session.email)
 
     st.markdown("""
     Welcome! Select one of our core features below to get started. Visit Settings to customize your experience.
@@ -0,0 +1,6 @@
+"""Offline benchmarks for the summarization, credit and transcription pipelines
+
+Run from the repository root:
+
+    python -m benchmarks.run
+"""
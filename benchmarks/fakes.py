@@ -0,0 +1,354 @@
+"""In-process stand-ins for Supabase, OpenAI, Anthropic and AssemblyAI
+
+Each fake has a configurable latency and failure rate. The LLM fakes sit
+behind an httpx transport, so the real SDKs, the shared connection pool,
+the retries and the circuit breakers all run as in production; only the
+network round trip is simulated.
+"""
+import asyncio
+import json
+import random
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from types import SimpleNamespace
+import httpx
+
+BENCH_EMAIL = "bench.user@example.com"
+# Session state key giving a simulated session its own user, see FakeUser
+USER_EMAIL_KEY = "fake_user_email"
+
+@dataclass
+class Latency:
+    """Simulated latency in seconds: mean, plus or minus jitter (uniform)"""
+    mean: float = 0.0
+    jitter: float = 0.0
+
+    def sample(self):
+        return max(0.0, self.mean + random.uniform(-self.jitter, self.jitter))
+
+@dataclass
+class BackendConfig:
+    supabase_latency: Latency
+    llm_first_token: Latency
+    llm_token_interval: float = 0.002
+    llm_output_chunks: int = 40
+    llm_failure_rate: float = 0.0
+    upload_bytes_per_second: float = 5_000_000
+    transcription_latency: Latency = field(default_factory=Latency)
+    transcription_failure_rate: float = 0.0
+    upload_failure_rate: float = 0.0
+
+# Supabase
+
+class FakeResponse:
+    def __init__(self, data):
+        self.data = data
+
+class FakeQuery:
+    """Chainable subset of the postgrest query builder used by the app"""
+
+    def __init__(self, db, table):
+        self.db = db
+        self.table = table
+        self.action = "select"
+        self.payload = None
+        self.filters = []
+
+    def select(self, *columns):
+        self.action = "select"
+        return self
+
+    def insert(self, payload):
+        self.action, self.payload = "insert", payload
+        return self
+
+    def update(self, payload):
+        self.action, self.payload = "update", payload
+        return self
+
+    def eq(self, column, value):
+        self.filters.append((column, value))
+        return self
+
+    def _matches(self, row):
+        return all(row.get(column) == value for column, value in self.filters)
+
+    def execute(self):
+        self.db.wait()
+        with self.db.lock:
+            rows = self.db.tables.setdefault(self.table, [])
+            if self.action == "insert":
+                new_rows = self.payload if isinstance(self.payload, list) else [self.payload]
+                rows.extend(dict(row) for row in new_rows)
+                return FakeResponse(new_rows)
+            matched = [row for row in rows if self._matches(row)]
+            if self.action == "update":
+                for row in matched:
+                    row.update(self.payload)
+            return FakeResponse([dict(row) for row in matched])
+
+class FakeRpc:
+    def __init__(self, db, name, params):
+        self.db = db
+        self.name = name
+        self.params = params
+
+    def execute(self):
+        self.db.wait()
+        with self.db.lock:
+            return FakeResponse(getattr(self.db, f"_rpc_{self.name}")(**self.params))
+
+class FakeSupabase:
+    """Thread-safe in-memory database answering the app's tables and RPCs
+
+    Exposes both the connection API (table) and the client API (client.rpc),
+    so it can stand in for st.connection("supabase").
+    """
+
+    def __init__(self, latency=None, initial_credit=1_000_000):
+        self.latency = latency or Latency()
+        self.initial_credit = initial_credit
+        self.lock = threading.Lock()
+        self.tables = {"prompts": [], "aiusage": [], "trace_spans": [], "stripe_events": []}
+        self.calls = 0
+        self.client = self
+
+    def wait(self):
+        with self.lock:
+            self.calls += 1
+        time.sleep(self.latency.sample())
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+    def rpc(self, name, params):
+        return FakeRpc(self, name, params)
+
+    def _row(self, email):
+        return next((row for row in self.tables["prompts"] if row["email"] == email), None)
+
+    def _rpc_bootstrap_user(self, p_email, p_default_prompt):
+        row = self._row(p_email)
+        if row is None:
+            row = {"email": p_email, "prompt": p_default_prompt, "credit": self.initial_credit}
+            self.tables["prompts"].append(row)
+        return [{"prompt": row["prompt"], "credit": row["credit"]}]
+
+    def _rpc_deduct_credits(self, p_email, p_amount=1):
+        row = self._row(p_email)
+        if row is None or row["credit"] < p_amount:
+            return None
+        row["credit"] -= p_amount
+        return row["credit"]
+
+    def _rpc_add_credits(self, p_email, p_amount):
+        row = self._row(p_email)
+        if row is None:
+            return None
+        row["credit"] = (row["credit"] or 0) + p_amount
+        return row["credit"]
+
+    def _rpc_latency_percentiles(self, p_since):
+        return []
+
+# OpenAI and Anthropic
+
+FAKE_SUMMARY = ("- **CC**: Suivi HTA\n- **HMA**: TA bien contrôlée sous amlodipine, pas de céphalée ni DRS\n"
+                "- **Examen physique**: TA 128/78, FC 72\n- **Plan d'action**: Poursuivre Tx, bilan lipidique dans 3 mois\n")
+
+class FakeLLMServer:
+    """httpx transport answering the chat completions and messages endpoints
+
+    Non-streamed answers arrive after the first-token latency, streamed
+    answers send their first chunk after it and the next ones every
+    llm_token_interval seconds. Failures are 529 overloaded (Anthropic) or
+    503 (OpenAI), which the app treats as transient.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.requests = 0
+        self.failures = 0
+        self.down = set()  # "openai" and/or "anthropic": every call fails
+
+    def transport(self, http=httpx):
+        """MockTransport of the given httpx flavour (httpx or httpx2)"""
+        async def handle(request):
+            return await self.handle(request, http)
+        return http.MockTransport(handle)
+
+    async def handle(self, request, http=httpx):
+        self.requests += 1
+        body = json.loads(request.content)
+        await asyncio.sleep(self.config.llm_first_token.sample())
+        anthropic = request.url.path.endswith("/messages")
+        if ("anthropic" if anthropic else "openai") in self.down or random.random() < self.config.llm_failure_rate:
+            self.failures += 1
+            if anthropic:
+                return http.Response(529, json={"type": "error", "error": {"type": "overloaded_error", "message": "Overloaded"}})
+            return http.Response(503, json={"error": {"message": "Service unavailable", "type": "server_error"}})
+
+        input_tokens = len(json.dumps(body.get("messages", ""))) // 4
+        chunks = self._chunks()
+        if anthropic:
+            if body.get("stream"):
+                return self._sse(http, self._anthropic_events(body["model"], chunks, input_tokens))
+            return http.Response(200, json=self._anthropic_message(body["model"], "".join(chunks), input_tokens))
+        if body.get("stream"):
+            return self._sse(http, self._openai_events(body["model"], chunks, input_tokens))
+        return http.Response(200, json=self._openai_completion(body["model"], "".join(chunks), input_tokens))
+
+    def _chunks(self):
+        size = max(1, len(FAKE_SUMMARY) // self.config.llm_output_chunks)
+        return [FAKE_SUMMARY[i:i + size] for i in range(0, len(FAKE_SUMMARY), size)]
+
+    def _sse(self, http, events):
+        async def body():
+            for index, event in enumerate(events):
+                if index:
+                    await asyncio.sleep(self.config.llm_token_interval)
+                yield event.encode("utf-8")
+        return http.Response(200, headers={"content-type": "text/event-stream"}, content=body())
+
+    @staticmethod
+    def _openai_completion(model, text, input_tokens):
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex}", "object": "chat.completion", "created": int(time.time()), "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": input_tokens, "completion_tokens": len(text) // 4,
+                      "total_tokens": input_tokens + len(text) // 4, "prompt_tokens_details": {"cached_tokens": 0}},
+        }
+
+    @staticmethod
+    def _openai_events(model, chunks, input_tokens):
+        base = {"id": f"chatcmpl-{uuid.uuid4().hex}", "object": "chat.completion.chunk", "created": int(time.time()), "model": model}
+        events = [
+            {**base, "choices": [{"index": 0, "delta": {"content": chunk}, "finish_reason": None}]}
+            for chunk in chunks
+        ]
+        output_tokens = sum(len(chunk) for chunk in chunks) // 4
+        events.append({**base, "choices": [], "usage": {
+            "prompt_tokens": input_tokens, "completion_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens, "prompt_tokens_details": {"cached_tokens": 0},
+        }})
+        return [f"data: {json.dumps(event)}\n\n" for event in events] + ["data: [DONE]\n\n"]
+
+    @staticmethod
+    def _anthropic_usage(input_tokens, output_tokens):
+        return {"input_tokens": input_tokens, "output_tokens": output_tokens,
+                "cache_read_input_tokens": 0, "cache_creation_input_tokens": 0}
+
+    def _anthropic_message(self, model, text, input_tokens):
+        return {
+            "id": f"msg_{uuid.uuid4().hex}", "type": "message", "role": "assistant", "model": model,
+            "content": [{"type": "text", "text": text}], "stop_reason": "end_turn", "stop_sequence": None,
+            "usage": self._anthropic_usage(input_tokens, len(text) // 4),
+        }
+
+    def _anthropic_events(self, model, chunks, input_tokens):
+        message = {**self._anthropic_message(model, "", input_tokens), "content": [], "stop_reason": None,
+                   "usage": self._anthropic_usage(input_tokens, 1)}
+        events = [("message_start", {"type": "message_start", "message": message}),
+                  ("content_block_start", {"type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}})]
+        events += [("content_block_delta", {"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": chunk}})
+                   for chunk in chunks]
+        events += [("content_block_stop", {"type": "content_block_stop", "index": 0}),
+                   ("message_delta", {"type": "message_delta", "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+                                      "usage": {"output_tokens": sum(len(chunk) for chunk in chunks) // 4}}),
+                   ("message_stop", {"type": "message_stop"})]
+        return [f"event: {name}\ndata: {json.dumps(data)}\n\n" for name, data in events]
+
+# AssemblyAI
+
+class FakeTranscriber:
+    """Stand-in for assemblyai.Transcriber: upload_file and transcribe
+
+    Uploads take len(data) / upload_bytes_per_second, transcriptions the
+    configured latency. Set FakeTranscriber.config before use. The app
+    makes one transcriber per segment, and each fails at most
+    MAX_UPLOAD_FAILURES uploads, fewer than the app retries: injected
+    failures then cost retries, never the recording, and runs compare.
+    """
+
+    config = None
+    MAX_UPLOAD_FAILURES = 2
+
+    def __init__(self, config=None):
+        self.transcription_config = config
+        self._upload_failures = 0
+
+    def upload_file(self, data):
+        import assemblyai as aai
+        # Read in chunks, as the SDK's HTTP client streams a file
+        while chunk := data.read(65536):
+            time.sleep(len(chunk) / self.config.upload_bytes_per_second)
+        if self._upload_failures < self.MAX_UPLOAD_FAILURES and random.random() < self.config.upload_failure_rate:
+            self._upload_failures += 1
+            # What the SDK raises when the upload endpoint answers 503
+            raise aai.types.TranscriptError("Failed to upload audio file: Injected failure", 503)
+        return f"https://cdn.example.com/upload/{uuid.uuid4().hex}"
+
+    def transcribe(self, data, config=None):
+        import assemblyai as aai
+        time.sleep(self.config.transcription_latency.sample())
+        if random.random() < self.config.transcription_failure_rate:
+            return SimpleNamespace(status=aai.TranscriptStatus.error, error="Injected failure", text=None, language_code=None)
+        return SimpleNamespace(status=aai.TranscriptStatus.completed, error=None,
+                               text="Patient vu pour suivi d'hypertension, tension bien contrôlée.", language_code="fr")
+
+class FakeUser:
+    """Logged-in user standing in for st.experimental_user
+
+    The email is read from st.session_state[USER_EMAIL_KEY] when a session
+    sets it, so simulated sessions can each have their own user.
+    """
+
+    is_logged_in = True
+
+    def __init__(self, default_email=BENCH_EMAIL):
+        self.default_email = default_email
+
+    @property
+    def email(self):
+        import streamlit as st
+        return st.session_state.get(USER_EMAIL_KEY, self.default_email)
+
+def install(config, email=BENCH_EMAIL, secrets=None):
+    """Point Streamlit, the providers and AssemblyAI at the fakes
+
+    Must run before the components are first used, so every cached
+    connection and client is created against the fakes.
+    Args:
+        secrets: extra entries for st.secrets, e.g. what the pages read
+    Returns:
+        tuple: (FakeSupabase, FakeLLMServer)
+    """
+    import assemblyai as aai
+    import streamlit as st
+    from streamlit.logger import set_log_level
+    from streamlit.runtime.secrets import Secrets
+
+    # Outside "streamlit run" every cached call warns about the missing script context
+    set_log_level("error")
+    database = FakeSupabase(config.supabase_latency)
+    llm = FakeLLMServer(config)
+    st.connection = lambda *args, **kwargs: database
+    st.experimental_user = FakeUser(email)
+    # A Secrets object rather than a dict, as AppTest swaps and restores it around runs
+    st.secrets = Secrets()
+    st.secrets._secrets = {"OPENAI_API_KEY": "bench", "Claude_API_KEY": "bench", "FAILOVER": {}, **(secrets or {})}
+
+    import anthropic
+    import openai
+    from components import providers
+
+    def http_client(provider):
+        client_class = (openai if provider == "openai" else anthropic).DefaultAsyncHttpxClient
+        return client_class(transport=llm.transport(providers.httpx_module(client_class)))
+    providers._http_client = http_client
+
+    FakeTranscriber.config = config
+    aai.Transcriber = FakeTranscriber
+    return database, llm
@@ -0,0 +1,93 @@
+"""Cold-start report: import time of every page and of each module it imports
+
+    python -m benchmarks.import_time                   # table per page and per module
+    python -m benchmarks.import_time --output imports.json
+
+Each page's top-level imports are read from its source and imported in a
+fresh interpreter with `python -X importtime`, after streamlit itself,
+which the server has loaded before any page runs. Imports inside
+functions are lazy and not counted, which is the point: opening the
+Support page should not load the LLM, transcription or payment SDKs.
+Run it in the container after a restart to see cold-start regressions.
+"""
+import argparse
+import ast
+import json
+import os
+import re
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PAGES = ["Scribe.py"] + sorted(os.path.join("pages", name) for name in os.listdir(os.path.join(ROOT, "pages"))
+                               if name.endswith(".py"))
+# SDKs no page should load before it calls them
+HEAVY_MODULES = ["openai", "anthropic", "assemblyai", "stripe"]
+# "import time: self [us] | cumulative | imported package", nesting shown by indentation
+_LINE_RE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)")
+
+def top_level_imports(path):
+    """Modules a script imports when it runs, in order, leaving out imports inside functions"""
+    with open(os.path.join(ROOT, path), encoding="utf-8") as f:
+        tree = ast.parse(f.read(), filename=path)
+    modules = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            modules.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module:
+            modules.append(node.module)
+    return [module for module in dict.fromkeys(modules) if module != "streamlit"]
+
+def measure(modules):
+    """Import modules in a fresh interpreter after streamlit
+    Returns:
+        tuple: (cumulative ms per module imported first-hand, heavy SDKs loaded)
+    """
+    code = "\n".join(
+        ["import streamlit", "import sys", "print('---', file=sys.stderr)"]
+        + [f"import {module}" for module in modules]
+        + [f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"]
+    )
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                            cwd=ROOT, capture_output=True, text=True)
+    if result.returncode:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+
+    times = {}
+    # Everything before the marker is streamlit's own import
+    for line in result.stderr.split("---", 1)[-1].splitlines():
+        match = _LINE_RE.match(line)
+        if match and not match.group(3):
+            times[match.group(4)] = int(match.group(2)) / 1000
+    loaded = [m for m in result.stdout.strip().split(",") if m]
+    return times, loaded
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--top", type=int, default=5, help="Slowest modules listed per page")
+    parser.add_argument("--output", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    report = {}
+    for page in PAGES:
+        times, loaded = measure(top_level_imports(page))
+        report[page] = {"total_ms": round(sum(times.values()), 1), "heavy_modules": loaded,
+                        "modules_ms": {module: round(ms, 1) for module, ms in times.items()}}
+
+    print(f"{'page':<36}{'import ms':>10}  SDKs loaded")
+    for page, r in report.items():
+        print(f"{page:<36}{r['total_ms']:>10}  {', '.join(r['heavy_modules']) or '-'}")
+    for page, r in report.items():
+        slowest = sorted(r["modules_ms"].items(), key=lambda item: -item[1])[:args.top]
+        if slowest:
+            print(f"\n{page}")
+            for module, ms in slowest:
+                print(f"  {module:<40}{ms:>9.1f} ms")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
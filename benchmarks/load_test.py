@@ -0,0 +1,244 @@
+"""Load test: concurrent simulated sessions through the real pages
+
+    python -m benchmarks.load_test                      # 1, 2, 4, ... 32 sessions
+    python -m benchmarks.load_test --levels 1 8 24 --rounds 2
+
+Every simulated doctor is a streamlit.testing AppTest session with its own
+user and session state, driven through the home page, Notes Summarization
+(one summary), Audio Summarization (one short recording), Payments &
+Settings and Performance, against the fake backends of benchmarks/fakes.py.
+The sessions of a level run at the same time, each on its own thread, like
+script runs in one Streamlit server process. Summaries run as background
+jobs: their steps time the wait until the page shows the result, rerunning
+it every second as its status polling does.
+
+For each concurrency level it reports session throughput, script-run
+latency, memory per session, and the first level where latency breaks
+down: p95 script-run latency over --breakdown-factor times the
+single-session p95, or any failed run.
+"""
+import argparse
+import gc
+import os
+import resource
+import sys
+import tempfile
+import threading
+import time
+from .fakes import BackendConfig, Latency, USER_EMAIL_KEY, install
+from .run import percentile
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Scribe.py")
+
+PAGES = {
+    "notes": "pages/3_Notes Summarization.py",
+    "audio": "pages/2_Audio  Summarization.py",
+    "settings": "pages/4_Payments & Settings.py",
+    "performance": "pages/6_Performance.py",
+}
+
+SECRETS = {
+    "password": {"app_password": "load-test"},
+    "ASSEMBLYAI": "load-test",
+    "STRIPE_SECRET_KEY": "sk_test_load",
+    "BASE_URL": "http://localhost:8501",
+}
+
+JOB_POLL_INTERVAL = 1.0  # As the pages poll their jobs
+
+NOTE = ("Patiente de 67 ans vue pour suivi HTA. Prend amlodipine 5 mg DIE. Pas de céphalée, pas de DRS. "
+        "TA 128/78, FC 72. Bilan lipidique à prévoir dans 3 mois.")
+
+def default_config():
+    # Closer to production than the benchmarks: seconds-long LLM and transcription calls
+    return BackendConfig(
+        supabase_latency=Latency(0.030, 0.010),
+        llm_first_token=Latency(1.0, 0.3),
+        llm_token_interval=0.01,
+        upload_bytes_per_second=2_000_000,
+        transcription_latency=Latency(2.0, 0.5),
+    )
+
+def share_runtime():
+    """Keep one runtime, pages setup and script cache for all AppTest sessions of the process
+
+    Each AppTest run installs a mock Runtime instance and clears it when it
+    ends, and resets the pages directory flag when it starts, which breaks
+    the other sessions still running on other threads. The first mock is
+    kept as the process runtime instead, like the single runtime of a real
+    server, and the resets are ignored. Scripts are compiled once in a
+    shared cache, as a server does, rather than on every run (concurrent
+    compiles also trip a CPython 3.11 ast race).
+    """
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.pages_manager import PagesManager
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+    from streamlit.testing.v1 import app_test, local_script_runner
+
+    class KeepFirstInstance(type):
+        def __setattr__(cls, name, value):
+            if name == "_instance" and value is not None and Runtime._instance is None:
+                Runtime._instance = value
+
+    class IgnoreReset(type):
+        def __setattr__(cls, name, value):
+            if value is not None:
+                setattr(PagesManager, name, value)
+
+    # Subclasses, so what AppTest builds from them keeps every attribute
+    app_test.Runtime = KeepFirstInstance("SharedRuntime", (Runtime,), {})
+    app_test.PagesManager = IgnoreReset("SharedPagesManager", (PagesManager,), {})
+    script_cache = ScriptCache()
+    app_test.ScriptCache = local_script_runner.ScriptCache = lambda: script_cache
+
+def rss_mb():
+    """Resident memory of the process in MB"""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * resource.getpagesize() / 1e6
+    except OSError:
+        # Peak rather than current RSS outside Linux (kB on Linux, bytes on macOS)
+        scale = 1e6 if sys.platform == "darwin" else 1e3
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+
+class SimulatedSession:
+    """One doctor going through the app, with timings of every script run"""
+
+    def __init__(self, index, recording, timeout):
+        from streamlit.testing.v1 import AppTest
+        self.index = index
+        self.recording = recording
+        self.app = AppTest.from_file(APP_PATH, default_timeout=timeout)
+        self.app.session_state[USER_EMAIL_KEY] = f"load.test.{index}@example.com"
+        self.runs = []  # (step, seconds)
+        self.errors = []
+
+    def _run(self, step, action):
+        start = time.perf_counter()
+        try:
+            action().run()
+            if self.app.exception:
+                raise RuntimeError(self.app.exception[0].value)
+        except Exception as e:
+            self.errors.append(f"{step}: {type(e).__name__}: {e}")
+            return False
+        finally:
+            self.runs.append((step, time.perf_counter() - start))
+        return True
+
+    def _wait_for_job(self, key):
+        """Rerun the page, as its status polling does, until the job in session_state[key] ends"""
+        from components.jobs import get_job, is_finished
+        while True:
+            job = get_job(self.app.session_state[key])
+            if is_finished(job):
+                if job is None or job["status"] != "done":
+                    raise RuntimeError(f"Job {job and job['status']}: {job and job['error']}")
+                return self.app
+            time.sleep(JOB_POLL_INTERVAL)
+            self.app.run()
+
+    def visit(self):
+        app = self.app
+        steps = [
+            ("home", lambda: app),
+            ("notes", lambda: app.switch_page(PAGES["notes"])),
+            ("notes_input", lambda: app.text_area[0].input(f"{NOTE} Session {self.index}, {time.time()}")),
+            ("notes_submit", lambda: app.button[0].click()),
+            ("notes_summary", lambda: self._wait_for_job("notes_job")),
+            ("audio", lambda: app.switch_page(PAGES["audio"])),
+            ("audio_upload", lambda: app.file_uploader[0].set_value(
+                (f"Patient {self.index}__20261017_093000.wav", self.recording, "audio/wav"))),
+            ("audio_submit", lambda: app.button[0].click()),
+            ("audio_summary", lambda: self._wait_for_job("audio_job")),
+            ("settings", lambda: app.switch_page(PAGES["settings"])),
+            ("performance", lambda: app.switch_page(PAGES["performance"])),
+        ]
+        for step, action in steps:
+            if not self._run(step, action):
+                return
+
+def run_level(level, rounds, recording, timeout):
+    """Run level sessions at once, each visiting the app rounds times
+    Returns:
+        dict: measurements for the level
+    """
+    gc.collect()
+    memory_before = rss_mb()
+    sessions = [SimulatedSession(i, recording, timeout) for i in range(level)]
+
+    def visit(session):
+        for _ in range(rounds):
+            session.visit()
+
+    threads = [threading.Thread(target=visit, args=(session,)) for session in sessions]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+
+    # Sessions are still referenced, so their state counts in the measurement
+    memory_after = rss_mb()
+    runs = [seconds * 1000 for session in sessions for _, seconds in session.runs]
+    errors = [error for session in sessions for error in session.errors]
+    if errors:
+        print(f"  {len(errors)} failed run(s), first: {errors[0]}")
+    return {
+        "sessions": level,
+        "throughput": round(level * rounds / wall, 3),
+        "runs": len(runs),
+        "p50_ms": round(percentile(runs, 50) or 0),
+        "p95_ms": round(percentile(runs, 95) or 0),
+        "max_ms": round(max(runs, default=0)),
+        "mb_per_session": round(max(0.0, memory_after - memory_before) / level, 2),
+        "errors": len(errors),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32], help="Concurrent sessions to try")
+    parser.add_argument("--rounds", type=int, default=1, help="Visits of the app per session")
+    parser.add_argument("--recording-minutes", type=float, default=1.0, help="Length of the uploaded recording")
+    parser.add_argument("--breakdown-factor", type=float, default=3.0, help="p95 slowdown, relative to one session, that counts as a breakdown")
+    parser.add_argument("--timeout", type=float, default=120, help="Seconds allowed per script run")
+    args = parser.parse_args()
+
+    # Job records of the run go to a scratch database
+    os.environ.setdefault("JOBS_DB_PATH", os.path.join(tempfile.mkdtemp(), "jobs.sqlite3"))
+    install(default_config(), secrets=SECRETS)
+    share_runtime()
+    from .scenarios import synthetic_recording
+    recording = synthetic_recording(args.recording_minutes)
+
+    # Warm-up outside the measurements: imports, cached resources, event loop
+    warm_up = SimulatedSession(-1, recording, args.timeout)
+    warm_up.visit()
+    for error in warm_up.errors:
+        print(f"Warm-up: {error}")
+
+    results = []
+    for level in args.levels:
+        print(f"{level} session(s)...", flush=True)
+        results.append(run_level(level, args.rounds, recording, args.timeout))
+
+    print(f"\n{'sessions':>8}{'visits/s':>10}{'runs':>6}{'p50 ms':>9}{'p95 ms':>9}{'max ms':>9}{'MB/sess':>9}{'errors':>8}")
+    for r in results:
+        print(f"{r['sessions']:>8}{r['throughput']:>10}{r['runs']:>6}{r['p50_ms']:>9}{r['p95_ms']:>9}{r['max_ms']:>9}{r['mb_per_session']:>9}{r['errors']:>8}")
+
+    reference = results[0]["p95_ms"]
+    breakdown = next((
+        r for r in results
+        if r["errors"] or r["p95_ms"] > args.breakdown_factor * reference
+    ), None)
+    if breakdown:
+        print(f"\nLatency breaks down at {breakdown['sessions']} concurrent sessions "
+              f"(p95 {breakdown['p95_ms']} ms vs {reference} ms for {results[0]['sessions']}, {breakdown['errors']} error(s))")
+    else:
+        print(f"\nNo breakdown up to {results[-1]['sessions']} concurrent sessions")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,173 @@
+"""Run the offline benchmarks and compare them with the stored baselines
+
+    python -m benchmarks.run                         # every scenario, exit 1 on regression
+    python -m benchmarks.run summary_claude credits  # some scenarios
+    python -m benchmarks.run --update-baselines      # store the current numbers
+
+Backends are the fakes of benchmarks/fakes.py with the latencies below,
+so the numbers measure the app's own overhead and concurrency on top of
+a fixed simulated network. A scenario regresses when its p50 or p95
+latency grows, or its throughput drops, by more than the tolerance, or
+when it fails more requests than its baseline. The throughput of
+scenarios whose requests take under a millisecond, like cache hits, is
+mostly thread-pool scheduling, so only their latency is compared. The
+p95 of scenarios with fewer than 20 requests is their single slowest
+request, so only their p50 is compared.
+"""
+import argparse
+import json
+import math
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from .fakes import BackendConfig, Latency, install
+
+BASELINES_PATH = os.path.join(os.path.dirname(__file__), "baselines.json")
+DEFAULT_TOLERANCE = 0.25
+LATENCY_SLACK_MS = 5  # Absolute allowance, for scenarios measured in fractions of a millisecond
+THROUGHPUT_MIN_P50_MS = 1  # Faster scenarios are not compared on throughput, which is then scheduling noise
+P95_MIN_REQUESTS = 20  # Below this the p95 is the slowest request, too noisy to compare
+
+def default_config():
+    return BackendConfig(
+        supabase_latency=Latency(0.010, 0.005),
+        llm_first_token=Latency(0.300, 0.100),
+        llm_token_interval=0.002,
+        upload_bytes_per_second=5_000_000,
+        transcription_latency=Latency(0.500, 0.100),
+    )
+
+def percentile(values, q):
+    """Nearest-rank percentile, q in [0, 100]"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+def measure(scenario):
+    """Run a scenario with its concurrent sessions after one warm-up request
+    Returns:
+        dict: throughput (requests/s), p50/p95/p99 latency (ms) and errors
+    """
+    def timed(_):
+        start = time.perf_counter()
+        try:
+            scenario.run()
+            return time.perf_counter() - start, None
+        except Exception as e:
+            return time.perf_counter() - start, e
+
+    if scenario.setup:
+        scenario.setup()
+    try:
+        # Warm-up: event loop, connection pool and caches of the process
+        timed(None)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=scenario.sessions) as pool:
+            results = list(pool.map(timed, range(scenario.requests)))
+        wall = time.perf_counter() - start
+    finally:
+        if scenario.teardown:
+            scenario.teardown()
+
+    latencies = [duration * 1000 for duration, error in results if error is None]
+    errors = [error for _, error in results if error is not None]
+    if errors:
+        print(f"  {len(errors)} error(s), first: {type(errors[0]).__name__}: {errors[0]}")
+    return {
+        "requests": scenario.requests,
+        "sessions": scenario.sessions,
+        "throughput": round(len(latencies) / wall, 2),
+        "p50_ms": round(percentile(latencies, 50) or 0, 1),
+        "p95_ms": round(percentile(latencies, 95) or 0, 1),
+        "p99_ms": round(percentile(latencies, 99) or 0, 1),
+        "errors": len(errors),
+    }
+
+def regressions(name, result, baseline, tolerance):
+    """Reasons why a result is worse than its baseline, empty if it is not"""
+    found = []
+    metrics = ["p50_ms", "p95_ms"] if baseline["requests"] >= P95_MIN_REQUESTS else ["p50_ms"]
+    for metric in metrics:
+        if result[metric] > baseline[metric] * (1 + tolerance) + LATENCY_SLACK_MS:
+            found.append(f"{name}: {metric} {result[metric]} > {baseline[metric]} +{tolerance:.0%}")
+    measurable = baseline["p50_ms"] >= THROUGHPUT_MIN_P50_MS
+    if measurable and result["throughput"] < baseline["throughput"] * (1 - tolerance):
+        found.append(f"{name}: throughput {result['throughput']} < {baseline['throughput']} -{tolerance:.0%}")
+    if result["errors"] > baseline["errors"]:
+        found.append(f"{name}: {result['errors']} error(s), baseline {baseline['errors']}")
+    return found
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("scenarios", nargs="*", help="Scenario names, all by default")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="Allowed slowdown, 0.25 = 25%%")
+    parser.add_argument("--update-baselines", action="store_true", help="Store the results as the new baselines")
+    parser.add_argument("--quick", action="store_true", help="A quarter of the requests, not compared to baselines")
+    parser.add_argument("--llm-failure-rate", type=float, default=0.0, help="Inject random LLM errors")
+    parser.add_argument("--output", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    config = default_config()
+    config.llm_failure_rate = args.llm_failure_rate
+    llm = install(config)[1]
+
+    # The components are imported once the fakes are in place
+    from components.user_session import bootstrap_user_session
+    from . import scenarios
+
+    bootstrap_user_session()
+    available = scenarios.build(llm, config, quick=args.quick)
+    names = args.scenarios or list(available)
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        parser.error(f"Unknown scenario(s): {', '.join(unknown)}. Available: {', '.join(available)}")
+
+    results = {}
+    for name in names:
+        print(f"{name}...", flush=True)
+        results[name] = measure(available[name])
+
+    print(f"\n{'scenario':<20}{'req':>6}{'sess':>6}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for name, r in results.items():
+        print(f"{name:<20}{r['requests']:>6}{r['sessions']:>6}{r['throughput']:>9}{r['p50_ms']:>10}{r['p95_ms']:>10}{r['p99_ms']:>10}{r['errors']:>8}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    if args.update_baselines:
+        baselines = {}
+        if os.path.exists(BASELINES_PATH):
+            with open(BASELINES_PATH, encoding="utf-8") as f:
+                baselines = json.load(f)
+        baselines.update(results)
+        with open(BASELINES_PATH, "w", encoding="utf-8") as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"\nBaselines updated in {BASELINES_PATH}")
+        return 0
+
+    if args.quick or args.llm_failure_rate:
+        return 0
+    if not os.path.exists(BASELINES_PATH):
+        print("\nNo baselines stored yet, run with --update-baselines")
+        return 0
+    with open(BASELINES_PATH, encoding="utf-8") as f:
+        baselines = json.load(f)
+    found = [
+        reason
+        for name, result in results.items() if name in baselines
+        for reason in regressions(name, result, baselines[name], args.tolerance)
+    ]
+    if found:
+        print("\nRegressions:")
+        for reason in found:
+            print(f"  {reason}")
+        return 1
+    print("\nNo regression against the baselines")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,126 @@
+"""Benchmark scenarios, each a callable run once per request
+
+Imported after fakes.install(), so every component runs against the fakes.
+"""
+import io
+import itertools
+from dataclasses import dataclass
+from typing import Callable, Optional
+import numpy as np
+import av
+from components import generate_summary, available_credits, user_session, resilience
+from components.tokens import CHARS_PER_TOKEN
+from components.transcription import transcribe_long_audio
+
+NOTE = ("Patiente de 67 ans vue pour suivi HTA. Prend amlodipine 5 mg DIE. Pas de céphalée, pas de DRS, "
+        "pas de dyspnée. TA 128/78, FC 72. Bilan lipidique à prévoir dans 3 mois. ")
+
+_counter = itertools.count()
+
+def unique_note(text=NOTE):
+    """A note never seen before, so the summary cache is missed"""
+    return f"{text}\nVisite #{next(_counter)}"
+
+def long_note(tokens):
+    """A note of about the given number of estimated tokens, for the map-reduce path"""
+    repeats = int(tokens * CHARS_PER_TOKEN / len(NOTE)) + 1
+    return "\n".join(f"{index}. {NOTE}" for index in range(repeats))
+
+def synthetic_recording(minutes, sample_rate=16000):
+    """WAV bytes of tone bursts separated by short silences, like speech turns"""
+    seconds = int(minutes * 60)
+    t = np.arange(sample_rate * 4) / sample_rate
+    burst = (0.3 * np.sin(2 * np.pi * 220 * t) * 32767).astype(np.int16)
+    pause = np.zeros(sample_rate, dtype=np.int16)
+    samples = np.tile(np.concatenate([burst, pause]), seconds // 5 + 1)[:seconds * sample_rate]
+
+    buffer = io.BytesIO()
+    with av.open(buffer, "w", format="wav") as container:
+        stream = container.add_stream("pcm_s16le", rate=sample_rate, layout="mono")
+        frame = av.AudioFrame.from_ndarray(samples.reshape(1, -1), format="s16", layout="mono")
+        frame.sample_rate = sample_rate
+        for packet in stream.encode(frame):
+            container.mux(packet)
+        for packet in stream.encode(None):
+            container.mux(packet)
+    return buffer.getvalue()
+
+def credit_cycle():
+    """Reserve and commit one credit, then read the balance as a page render does"""
+    reservation, message = available_credits.reserve_credits(user_session.get_user_session().email, 1)
+    if reservation is None:
+        raise RuntimeError(message)
+    available_credits.commit_reservation(reservation)
+    available_credits.get_user_credits(user_session.get_user_session().email)
+
+def summary(model):
+    def run():
+        generate_summary.summarize(unique_note(), model, "benchmark")
+    return run
+
+def stream_summary(model):
+    def run():
+        for _ in generate_summary.stream_summarize(unique_note(), model, "benchmark"):
+            pass
+    return run
+
+def cached_summary(model):
+    def run():
+        generate_summary.summarize(NOTE, model, "benchmark")
+    return run
+
+def map_reduce_summary(model, tokens):
+    note = long_note(tokens)
+    def run():
+        generate_summary.summarize(unique_note(note), model, "benchmark")
+    return run
+
+def audio_pipeline(minutes):
+    """The Audio Summarization page flow: decode, split, transcribe segments, summarize"""
+    recording = synthetic_recording(minutes)
+    def run():
+        transcript, _ = transcribe_long_audio(io.BytesIO(recording), config=None)
+        generate_summary.summarize(unique_note(transcript), "claude-3-5-sonnet-latest", "benchmark", compact=True)
+    return run
+
+def flaky_uploads(config, failure_rate):
+    """Setup and teardown for a scenario where a share of the segment uploads fail"""
+    def setup():
+        config.upload_failure_rate = failure_rate
+    def teardown():
+        config.upload_failure_rate = 0.0
+    return setup, teardown
+
+def provider_outage(llm, provider):
+    """Setup and teardown for a scenario where one provider answers every call with an error"""
+    def setup():
+        llm.down.add(provider)
+    def teardown():
+        llm.down.discard(provider)
+        resilience._breakers().clear()
+    return setup, teardown
+
+@dataclass
+class Scenario:
+    run: Callable[[], None]
+    requests: int
+    sessions: int
+    setup: Optional[Callable[[], None]] = None
+    teardown: Optional[Callable[[], None]] = None
+
+def build(llm, config, quick=False):
+    """All scenarios by name; quick runs a quarter of the requests"""
+    scale = 4 if quick else 1
+    outage = provider_outage(llm, "anthropic")
+    return {
+        "credits": Scenario(credit_cycle, 200 // scale, 8),
+        "summary_openai": Scenario(summary("gpt-4o-mini"), 40 // scale, 8),
+        "summary_claude": Scenario(summary("claude-3-5-sonnet-latest"), 40 // scale, 8),
+        "stream_openai": Scenario(stream_summary("gpt-4o-mini"), 40 // scale, 8),
+        "stream_claude": Scenario(stream_summary("claude-3-5-sonnet-latest"), 40 // scale, 8),
+        "summary_cached": Scenario(cached_summary("gpt-4o-mini"), 200 // scale, 8),
+        "summary_map_reduce": Scenario(map_reduce_summary("claude-3-5-sonnet-latest", 30000), 8 // scale, 4),
+        "summary_failover": Scenario(summary("claude-3-5-sonnet-latest"), 40 // scale, 8, *outage),
+        "audio_pipeline": Scenario(audio_pipeline(11), 8 // scale, 2),
+        "audio_pipeline_flaky_upload": Scenario(audio_pipeline(11), 8 // scale, 2, *flaky_uploads(config, 0.3)),
+    }
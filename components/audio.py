@@ -0,0 +1,71 @@
+import io
+import av
+import numpy as np
+from pydub import AudioSegment
+
+# Speech recognition does not need more than 16 kHz mono
+TARGET_RATE = 16000
+
+# name: (container format, codec, file extension, mime type)
+FORMATS = {
+    "opus": ("ogg", "libopus", "ogg", "audio/ogg"),
+    "flac": ("flac", "flac", "flac", "audio/flac"),
+}
+UPLOAD_FORMAT = "opus"
+OPUS_BIT_RATE = 32000
+
+# Extensions accepted by the uploaders, anything av/ffmpeg can decode would work
+INPUT_TYPES = ["wav", "mp3", "m4a", "webm", "ogg", "flac"]
+
+def iter_samples(source):
+    """Decode an audio file frame by frame, downmixed/resampled to 16 kHz mono
+    Only one decoded frame is held at a time, so large files stream.
+    Args:
+        source: path or seekable file-like object (wav, mp3, m4a, webm, ogg, ...)
+    Yields:
+        np.ndarray: int16 samples at TARGET_RATE
+    """
+    if hasattr(source, "seek"):
+        source.seek(0)
+    resampler = av.AudioResampler(format="s16", layout="mono", rate=TARGET_RATE)
+    with av.open(source) as container:
+        for frame in container.decode(audio=0):
+            for out in resampler.resample(frame):
+                yield out.to_ndarray().reshape(-1)
+        # Flush samples buffered in the resampler
+        for out in resampler.resample(None):
+            yield out.to_ndarray().reshape(-1)
+
+def load_audio(source):
+    """Decode an audio file and downmix/resample it to 16 kHz mono
+    Args:
+        source: path or seekable file-like object (wav, mp3, m4a, webm, ogg, ...)
+    Returns:
+        AudioSegment: 16-bit mono PCM at TARGET_RATE
+    """
+    data = b"".join(samples.tobytes() for samples in iter_samples(source))
+    return AudioSegment(data=data, sample_width=2, frame_rate=TARGET_RATE, channels=1)
+
+def encode_audio(segment, fmt=UPLOAD_FORMAT):
+    """Encode a mono AudioSegment to Opus or FLAC in memory
+    Returns:
+        io.BytesIO: encoded file positioned at the start
+    """
+    container_format, codec, _, _ = FORMATS[fmt]
+    segment = segment.set_channels(1).set_frame_rate(TARGET_RATE).set_sample_width(2)
+
+    buffer = io.BytesIO()
+    with av.open(buffer, mode="w", format=container_format) as container:
+        stream = container.add_stream(codec, rate=TARGET_RATE, layout="mono")
+        if fmt == "opus":
+            stream.bit_rate = OPUS_BIT_RATE
+        samples = np.frombuffer(segment.raw_data, dtype=np.int16).reshape(1, -1)
+        frame = av.AudioFrame.from_ndarray(samples, format="s16", layout="mono")
+        frame.sample_rate = TARGET_RATE
+        # The encoder splits the frame to its own frame size
+        for packet in stream.encode(frame):
+            container.mux(packet)
+        for packet in stream.encode(None):
+            container.mux(packet)
+    buffer.seek(0)
+    return buffer
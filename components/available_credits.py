@@ -1,17 +1,59 @@
+import threading
+import time
+import uuid
 import streamlit as st
 from st_supabase_connection import SupabaseConnection, execute_query
 from typing import Tuple, Optional
+from .cache import TTLCache
+from .user_session import get_user_session, update_user_session
+
+@st.cache_resource
+def _balance_cache():
+    """Credit balances by email, shared by all sessions
+    Kept current by debits and refunds made through this module. Purchases
+    are granted elsewhere, by the webhook service: after the Stripe redirect
+    the purchase page re-queries the balance until the grant shows up. The
+    TTL bounds drift from other changes made elsewhere for sessions whose
+    own copy of the balance was dropped.
+    """
+    return TTLCache(max_entries=1000, ttl=300)
+
+@st.cache_resource
+def _reservations():
+    """Reserved credits not committed or released yet: id -> (email, amount, reserved_at)"""
+    return {}, threading.Lock()
+
+def _remember_balance(user_email, credits):
+    """Write a balance returned by the database through to the cache and the session"""
+    _balance_cache().set(user_email, credits)
+    update_user_session(user_email, credit=credits)
+
+def invalidate_user_credits(user_email):
+    """Forget the known balance of a user, after it changed outside this process"""
+    _balance_cache().invalidate(user_email)
+    update_user_session(user_email, credit=None)
 
 def get_user_credits(user_email):
-    """Get user credits from the prompts table"""
+    """Get user credits, from the session object or the balance cache when possible"""
     if not user_email:
         return None
+
+    session = get_user_session()
+    if session is not None and session.email == user_email and session.credit is not None:
+        return session.credit
         
+    credits = _balance_cache().get(user_email)
+    if credits is not None:
+        return credits
+
     try:
         conn = st.connection("supabase", type=SupabaseConnection)
         query = conn.table("prompts").select("credit").eq("email", user_email)
         response = execute_query(query, ttl=0)
-        return response.data[0]["credit"] if response.data else None
+        credits = response.data[0]["credit"] if response.data else None
+        if credits is not None:
+            _remember_balance(user_email, credits)
+        return credits
     except Exception as e:
         st.error(f"Error fetching credits: {str(e)}")
         return None
@@ -26,7 +68,7 @@ def display_credits(user_email):
         st.warning("No credit information available")
 
 def deduct_credit(user_email: str, amount: int = 1) -> Tuple[bool, str]:
-    """Deduct credits from user's account
+    """Atomically deduct credits from user's account in one round trip
     Returns:
         tuple: (bool, str) - (success, message)
     """
@@ -36,28 +78,16 @@ def deduct_credit(user_email: str, amount: int = 1) -> Tuple[bool, str]:
     try:
         conn = st.connection("supabase", type=SupabaseConnection)
         
-        # Get current credits
-        current_credits = get_user_credits(user_email)
-              
-        if current_credits is None:
-            return False, "No credit information found"
-            
-        if current_credits < amount:
-            return False, f"Insufficient credits: {current_credits} available, {amount} needed"
-            
-        # Update credits in database
-        new_credits = current_credits - amount
-        result = conn.table("prompts").update({"credit": new_credits}).eq("email", user_email).execute()
+        # Conditional decrement in the database, returns NULL if the balance is too low
+        result = conn.client.rpc("deduct_credits", {"p_email": user_email, "p_amount": amount}).execute()
+        new_credits = result.data
         
-        # Check if the update affected any rows
-        if not result.data:
-            return False, f"No rows updated for email: {user_email}"
-            
-        # Verify the new credit value
-        updated_credits = get_user_credits(user_email)
-        if updated_credits != new_credits:
-            return False, f"Credit update failed: expected {new_credits}, got {updated_credits}"
+        if new_credits is None:
+            # The cached balance may be stale, read it again next time
+            invalidate_user_credits(user_email)
+            return False, f"Insufficient credits or no credit information found ({amount} needed)"
             
+        _remember_balance(user_email, new_credits)
         return True, f"Credits deducted successfully. Remaining: {new_credits}"
         
     except Exception as e:
@@ -66,34 +96,69 @@ def deduct_credit(user_email: str, amount: int = 1) -> Tuple[bool, str]:
         print(error_msg)  # For server-side logging
         return False, error_msg
 
-def add_credits(user_email, amount=300):
-    """Add credits to user's account
+def refund_credit(user_email: str, amount: int = 1) -> Tuple[bool, str]:
+    """Give back credits deducted for a request that failed afterwards
     Returns:
         tuple: (bool, str) - (success, message)
     """
+    success, message = _increment_credits(user_email, amount)
+    if not success:
+        print(f"Failed to refund {amount} credit(s) to {user_email}: {message}")  # For server-side logging
+        return False, message
+    return True, f"Credits refunded successfully. New balance: {message}"
+
+def _increment_credits(user_email, amount):
+    """Atomically add credits through the add_credits database function
+    Returns:
+        tuple: (bool, str) - (success, new balance or error message)
+    """
     if not user_email:
         return False, "No user email provided"
         
     try:
         conn = st.connection("supabase", type=SupabaseConnection)
+        result = conn.client.rpc("add_credits", {"p_email": user_email, "p_amount": amount}).execute()
         
-        # Get current credits
-        current_credits = get_user_credits(user_email)
-        if current_credits is None:
-            return False, "No credit information found"
-            
-        # Update credits in database
-        new_credits = current_credits + amount
-        result = conn.table("prompts").update({"credit": new_credits}).eq("email", user_email).execute()
-        
-        # Check if the update affected any rows
-        if hasattr(result, 'count') and result.count == 0:
+        if result.data is None:
             return False, f"No rows updated for email: {user_email}"
             
-        return True, f"Credits added successfully. New balance: {new_credits}"
+        _remember_balance(user_email, result.data)
+        return True, str(result.data)
         
     except Exception as e:
-        error_msg = f"Error in add_credits: {str(e)}"
-        st.error(error_msg)
-        print(error_msg)  # For server-side logging
+        error_msg = str(e)
+        print(f"Error updating credits: {error_msg}")  # For server-side logging
         return False, error_msg
+
+def reserve_credits(user_email: str, amount: int = 1) -> Tuple[Optional[str], str]:
+    """Take credits up front for a request, to be committed on success or released on failure
+    Returns:
+        tuple: (str or None, str) - (reservation id, message)
+    """
+    success, message = deduct_credit(user_email, amount)
+    if not success:
+        return None, message
+    reservation_id = uuid.uuid4().hex
+    reservations, lock = _reservations()
+    with lock:
+        reservations[reservation_id] = (user_email, amount, time.time())
+    return reservation_id, message
+
+def commit_reservation(reservation_id: str) -> None:
+    """Keep the reserved credits: the request succeeded"""
+    reservations, lock = _reservations()
+    with lock:
+        reservations.pop(reservation_id, None)
+
+def release_reservation(reservation_id: str) -> Tuple[bool, str]:
+    """Give the reserved credits back: the request failed
+    Returns:
+        tuple: (bool, str) - (success, message)
+    """
+    reservations, lock = _reservations()
+    with lock:
+        reservation = reservations.pop(reservation_id, None)
+    if reservation is None:
+        return False, "Unknown or already settled reservation"
+    user_email, amount, _ = reservation
+    return refund_credit(user_email, amount)
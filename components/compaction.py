@@ -0,0 +1,98 @@
+import re
+import unicodedata
+
+# Transcript compaction: speech-to-text output keeps every hesitation,
+# false start and repetition of the conversation. They carry no clinical
+# content but are billed as input tokens and slow the summary down, so
+# they are removed before the LLM call. The rules only delete words that
+# repeat or carry no meaning on their own; numbers and clinical terms are
+# never touched.
+
+# Hesitations in French and English, removed wherever they stand alone.
+# Never a word that is also an abbreviation or a word of its own ("ER"),
+# and never part of a hyphenated answer ("uh-huh", "uh-uh", "mm-hmm").
+FILLERS = ["euh", "euhm", "heu", "hein", "hum", "hmm", "mmh", "uh", "uhm", "um", "erm"]
+# Only removed as an aside set off by commas: without them the same words
+# are a question ("Tu vois bien de cet oeil?", "Do you know your blood type?")
+FILLER_PHRASES = ["you know", "i mean", "tu sais", "vous savez", "tu vois", "vous voyez"]
+# Words that legitimately come twice in a row and are never stutters:
+# numbers ("twenty twenty", "cinq cinq") and French reflexives ("vous vous êtes blessé")
+NEVER_REPEATED = [
+    "zero", "one", "two", "three", "four", "five", "six", "seven", "eight", "nine", "ten",
+    "eleven", "twelve", "thirteen", "fourteen", "fifteen", "sixteen", "seventeen", "eighteen", "nineteen",
+    "twenty", "thirty", "forty", "fifty", "sixty", "seventy", "eighty", "ninety", "hundred", "thousand",
+    "zéro", "un", "une", "deux", "trois", "quatre", "cinq", "sept", "huit", "neuf", "dix",
+    "onze", "douze", "treize", "quatorze", "quinze", "seize", "vingt", "trente", "quarante",
+    "cinquante", "soixante", "cent", "mille",
+    "nous", "vous",
+]
+
+# Sentences made only of these greetings and thanks are courtesy, not
+# history. Nothing that can answer a question ("Right.", "Très bien.",
+# "Good.", "OK.") is listed: answers are kept whatever they are.
+SMALL_TALK = [
+    "bonjour", "bonsoir", "salut", "merci beaucoup", "merci", "au revoir", "bonne journée", "bonne soirée",
+    "hello", "hi", "thank you very much", "thank you", "thanks", "goodbye", "bye",
+    "good morning", "good afternoon", "good evening",
+]
+
+_FILLER_RE = re.compile(
+    r"(?:,\s*)?(?<![\w'-])(?:" + "|".join(map(re.escape, FILLERS)) + r")(?![\w'-])(?:\s*,)?",
+    re.IGNORECASE,
+)
+# ", you know," inside a sentence, or "You know," at its start
+_FILLER_PHRASE_RE = re.compile(
+    r"(?:,\s*|^\s*|(?<=[.!?…])\s+)(?:" + "|".join(map(re.escape, FILLER_PHRASES)) + r")\s*,",
+    re.IGNORECASE,
+)
+# "hyper- hypertension": a cut-off word followed by the full word
+_FALSE_START_RE = re.compile(r"(?<![\w'])([^\W\d]+)-\s+(?=\1)", re.IGNORECASE)
+# "je je je" or "I think, I think": the same 1 to 6 words back to back, never numbers
+_WORD = r"(?!(?:" + "|".join(NEVER_REPEATED) + r")(?![\w'-]))[^\W\d]+"
+_REPEAT_RE = re.compile(
+    r"(?<![\w'-])((?:" + _WORD + r"[\s']+){0,5}" + _WORD + r")(?:[\s,]+\1)+(?![\w'-])",
+    re.IGNORECASE,
+)
+_SENTENCE_RE = re.compile(r"(?<=[.!?…])\s+")
+_SMALL_TALK_RE = re.compile(r"(?<![\w'])(?:" + "|".join(map(re.escape, SMALL_TALK)) + r")(?![\w'])")
+
+def _clean_punctuation(text):
+    text = re.sub(r"([.!?…])(?:\s+\.)+", r"\1", text)
+    text = re.sub(r"\s+([,.!?;:…])", r"\1", text)
+    text = re.sub(r",(?:\s*,)+", ",", text)
+    text = re.sub(r",\s*([.!?;:…])", r"\1", text)
+    text = re.sub(r"^[\s,;:]+", "", text)
+    return re.sub(r"\s{2,}", " ", text).strip()
+
+def _sentence_key(sentence):
+    """Lowercase words of a sentence without punctuation, to spot duplicates"""
+    return " ".join(re.findall(r"[\w']+", sentence.lower()))
+
+def _compact_line(line):
+    text = _FILLER_PHRASE_RE.sub(" ", line)
+    text = _FILLER_RE.sub("", text)
+    text = _FALSE_START_RE.sub("", text)
+    text = _REPEAT_RE.sub(r"\1", text)
+
+    sentences = []
+    for sentence in _SENTENCE_RE.split(_clean_punctuation(text)):
+        sentence = _clean_punctuation(sentence)
+        key = _sentence_key(sentence)
+        # Empty once the fillers are gone, or greetings and thanks only
+        if not key or not _SMALL_TALK_RE.sub("", key).strip():
+            continue
+        sentences.append(sentence[0].upper() + sentence[1:])
+    return " ".join(sentences)
+
+def compact_transcript(text):
+    """Normalize a transcript and remove its disfluencies
+    Drops hesitations, false starts, stutters, repeated phrases and
+    sentences made only of greetings or thanks. Line breaks are kept.
+    Returns:
+        str: the compacted transcript
+    """
+    if not text:
+        return text
+    text = unicodedata.normalize("NFC", text).replace(" ", " ")
+    lines = (_compact_line(line) for line in text.splitlines())
+    return "\n".join(line for line in lines if line)
@@ -1,119 +1,306 @@
 import streamlit as st
-from openai import OpenAI
 from st_supabase_connection import SupabaseConnection
-import anthropic
+import asyncio
 import json
+import hashlib
+import threading
 import time
 from .get_prompt import get_user_prompt_text
-from .available_credits import deduct_credit
-
-clientGPT = OpenAI(
-   api_key = st.secrets["OPENAI_API_KEY"],
-)
-client = anthropic.Anthropic(
-    # defaults to os.environ.get("ANTHROPIC_API_KEY")
-    api_key=st.secrets["Claude_API_KEY"],
-)
-conn = st.connection("supabase",type=SupabaseConnection)
-
-def generate_summary(input_text, model, tag):
-    # Check and deduct credits first
-    success, message = deduct_credit(st.experimental_user.email)
-    if not success:
-        raise Exception(f"Credit deduction failed: {message}")
-
-    retries = 5
-    for i in range(retries):
-        try:
-            user_prompt = get_user_prompt_text(conn)
-            completion = clientGPT.chat.completions.create(
-                model= model,
-                store = True,
-                metadata = {"category": tag},
-                top_p =0.2,
-                messages = [
-                {"role": "system",
-                "content": "You are a helpful assistant trained to summarize medical notes in french and english. You will be given a raw medical note or conversation transcript. Clear point form and no sentence. Use Medical abreveations."},
-                {
-                    "role": "user",
-                    "content": f"""{user_prompt}
-
-                    Résumez le texte suivant :  
-
-                    {input_text}
-                    """
-                }
-            ],
-                max_tokens=1024
-            )
-            ai_output_text = completion.choices[0].message.content.strip()
-            input_tokens = completion.usage.prompt_tokens 
-            output_tokens = completion.usage.completion_tokens
-            data = {
-                "input_text": input_text,
-                "ai_output_text": ai_output_text,
-                "input_tokens": input_tokens,
-                "output_tokens": output_tokens,
-                "model": model,
-                "tag": tag
-                }
-                
-            response = conn.table("aiusage").insert(data).execute() 
-            return ai_output_text, input_tokens, output_tokens
-        except anthropic.InternalServerError as e:
-            if i < retries - 1 and 'overloaded_error' in str(e):
-                time.sleep(2 ** i)  # Exponential backoff
-                continue
-            else:
-                raise e
-        except Exception as e:
-            raise e
-    
-def generate_summary_claude(input_text,model, tag):
-    # Check and deduct credits first
-    success, message = deduct_credit(st.experimental_user.email)
-    if not success:
-        raise Exception(f"Credit deduction failed: {message}")
-
-    retries = 5
-    for i in range(retries):
+from .tokens import estimate_tokens, split_by_tokens
+from .compaction import compact_transcript
+from .available_credits import reserve_credits, commit_reservation, release_reservation
+from .usage_writer import get_usage_writer
+from .cache import TTLCache
+from .providers import OPENAI_MODELS, MAX_OUTPUT_TOKENS, get_provider, provider_name, run, iterate
+from .resilience import call_with_failover, stream_with_failover
+from .tracing import Trace
+
+SYSTEM_PROMPT_GPT = "You are a helpful assistant trained to summarize medical notes in french and english. You will be given a raw medical note or conversation transcript. Clear point form and no sentence. Use Medical abreveations."
+SYSTEM_PROMPT_CLAUDE = "You are a helpful assistant trained to summarize medical notes or trascription between patent and doctor in french and english. You will be given a raw medical note or conversation transcript. Use Medical abreveations."
+
+# No LLM call gets more than its model's budget of estimated input tokens.
+# Inputs over the budget are summarized in two passes: chunks are
+# summarized in parallel (map), then the partial summaries are merged with
+# the user's template (reduce). Every LLM call costs one credit.
+INPUT_TOKEN_BUDGETS = {
+    "chatgpt-4o-latest": 12000,
+    "gpt-4o-mini": 12000,
+    "o1-mini": 8000,
+    "claude-3-5-sonnet-latest": 16000,
+}
+DEFAULT_INPUT_TOKEN_BUDGET = 12000
+MAP_CHUNK_TOKENS = 6000
+MAP_SYSTEM_PROMPT = "You are a helpful assistant trained to summarize medical notes or trascription between patent and doctor in french and english. You will be given one part of a longer note or transcript. List every clinically relevant fact in point form, in the language of the text, without adding anything. Use Medical abreveations."
+
+def _system_prompt(model):
+    return SYSTEM_PROMPT_GPT if model in OPENAI_MODELS else SYSTEM_PROMPT_CLAUDE
+
+def _summary_request(input_text):
+    # The note goes last, after the cacheable system prompt and user's prompt
+    return f"Résumez le texte suivant :\n\n{input_text}"
+
+def _plan_credits(input_text, model):
+    """Split the input for map-reduce if it is over the model's input budget
+    Raises:
+        ValueError: if even the partial summaries would be over the budget
+    Returns:
+        tuple: (chunks, credits) - one credit per LLM call
+    """
+    budget = INPUT_TOKEN_BUDGETS.get(model, DEFAULT_INPUT_TOKEN_BUDGET)
+    if estimate_tokens(input_text) <= budget:
+        return [input_text], 1
+    chunks = split_by_tokens(input_text, min(MAP_CHUNK_TOKENS, budget // 2))
+    if len(chunks) * MAX_OUTPUT_TOKENS > budget:
+        raise ValueError(f"Input too long for {model}: about {estimate_tokens(input_text)} tokens")
+    return chunks, len(chunks) + 1
+
+def _prepare_input(input_text, compact, trace):
+    """Compact a transcript if asked
+    Returns:
+        tuple: (text to summarize, token counts before/after for aiusage)
+    """
+    raw_input_tokens = estimate_tokens(input_text)
+    if compact:
+        with trace.span("compaction"):
+            input_text = compact_transcript(input_text)
+    token_counts = {"raw_input_tokens": raw_input_tokens, "compacted_input_tokens": estimate_tokens(input_text)}
+    return input_text, token_counts
+
+async def _complete(model, system, prefix, content, tag):
+    """One completion behind the circuit breakers, with failover
+    Returns:
+        tuple: (model actually used, text, usage) - usage includes latency_ms, and ttft_ms as None
+    """
+    start = time.perf_counter()
+    used, (text, usage) = await call_with_failover(
+        model, provider_name,
+        lambda candidate: get_provider(candidate).complete(candidate, system(candidate), prefix, content, tag)
+    )
+    # Without streaming there is no first token to time: ttft_ms stays empty so
+    # the time-to-first-token percentiles only cover streamed calls
+    latency_ms = round((time.perf_counter() - start) * 1000)
+    return used, text, {**usage, "latency_ms": latency_ms, "ttft_ms": None}
+
+async def _map_chunks(chunks, model, tag):
+    return await asyncio.gather(*(
+        _complete(model, lambda _: MAP_SYSTEM_PROMPT, None, f"Partie {index}/{len(chunks)} :\n\n{chunk}", f"{tag}_map")
+        for index, chunk in enumerate(chunks, start=1)
+    ))
+
+def _reduce_input(chunks, model, tag, trace):
+    """Run the map pass concurrently and return the text for the final summary
+    A single chunk is returned as is.
+    """
+    if len(chunks) == 1:
+        return chunks[0]
+    partials = []
+    with trace.span("llm_map"):
+        results = run(_map_chunks(chunks, model, tag))
+    for used, text, usage in results:
+        _log_usage(model=used, tag=f"{tag}_map", trace_id=trace.trace_id, **usage)
+        partials.append(text)
+    return "Résumés partiels d'une même consultation, dans l'ordre :\n\n" + "\n\n".join(partials)
+
+def _user_and_prompt(user_email, user_prompt, trace):
+    """The email and prompt a background job passed in, or those of the session's user"""
+    if user_prompt is None:
+        with trace.span("prompt_fetch"):
+            user_prompt = get_user_prompt_text(st.connection("supabase", type=SupabaseConnection))
+    return user_email or st.experimental_user.email, user_prompt
+
+@st.cache_resource
+def _result_cache():
+    """Summaries of all sessions, so a rerun of the same request is free"""
+    return TTLCache(max_entries=200, ttl=3600)
+
+@st.cache_resource
+def _in_flight():
+    """Result keys of the summaries being made, with an event set when each one ends"""
+    return {}, threading.Lock()
+
+def _result_key(input_text, user_prompt, model, user_email):
+    """Content address of a summary: hash of the note, the effective prompt, the model and the user
+    The user is part of it so that a summary is only ever free for the user who paid for it.
+    """
+    payload = json.dumps([input_text, user_prompt, model, user_email], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def _claim(cache_key):
+    """The cached summary for a key, waiting for a running request with the same key to end
+    Returns:
+        str or None: the summary, or None when the caller has to make it; it must
+            then call _release(cache_key) once done, whether it succeeded or not
+    """
+    # Cache hits, the common case, skip the in-flight lock
+    cached = _result_cache().get(cache_key)
+    if cached is not None:
+        return cached
+    pending, lock = _in_flight()
+    while True:
+        with lock:
+            cached = _result_cache().get(cache_key)
+            if cached is not None:
+                return cached
+            running = pending.get(cache_key)
+            if running is None:
+                pending[cache_key] = threading.Event()
+                return None
+        # e.g. a double click: wait and take its summary rather than paying twice.
+        # If it failed, the loop claims the key and this request makes the summary.
+        running.wait()
+
+def _release(cache_key):
+    pending, lock = _in_flight()
+    with lock:
+        pending.pop(cache_key).set()
+
+def _log_usage(model, tag, input_tokens=0, output_tokens=0,
+               cached_input_tokens=0, cache_creation_input_tokens=0, ttft_ms=None, latency_ms=None, trace_id=None,
+               raw_input_tokens=None, compacted_input_tokens=None):
+    """Queue a usage record for the aiusage table, written in the background
+    Only counts and timings are recorded: notes, transcripts and summaries are
+    never written to the table or its spill file.
+    ttft_ms and latency_ms time the LLM call itself, from request to first and last token;
+    ttft_ms is None for calls that were not streamed.
+    raw_input_tokens and compacted_input_tokens are local estimates for the
+    request's input before and after transcript compaction.
+    """
+    data = {
+        "input_tokens": input_tokens,
+        "output_tokens": output_tokens,
+        "cached_input_tokens": cached_input_tokens,
+        "cache_creation_input_tokens": cache_creation_input_tokens,
+        "ttft_ms": ttft_ms,
+        "latency_ms": latency_ms,
+        "trace_id": trace_id,
+        "raw_input_tokens": raw_input_tokens,
+        "compacted_input_tokens": compacted_input_tokens,
+        "model": model,
+        "tag": tag
+        }
+    get_usage_writer().enqueue(data)
+
+def summarize(input_text, model, tag, trace=None, compact=False, user_email=None, user_prompt=None):
+    """Summarize a note or transcript with the user's prompt, on OpenAI or Claude
+    Args:
+        trace: optional Trace of the whole request, finished by the caller; one is created otherwise
+        compact: remove disfluencies first, for speech transcripts
+        user_email, user_prompt: the user to charge and their prompt, both given
+            when running outside a session (background jobs); the session's otherwise
+    Returns:
+        tuple: (summary, input_tokens, output_tokens)
+    """
+    own_trace = trace is None
+    trace = trace or Trace(tag, model)
+    input_text, token_counts = _prepare_input(input_text, compact, trace)
+
+    # Same note, prompt, model and user as a recent or running request: no new call, no credit
+    user_email, user_prompt = _user_and_prompt(user_email, user_prompt, trace)
+    cache_key = _result_key(input_text, user_prompt, model, user_email)
+    cached = _claim(cache_key)
+    if cached is not None:
+        if own_trace:
+            trace.finish()
+        return cached, 0, 0
+
+    try:
+        # Reserve credits first, one per LLM call, and commit them only on success
+        chunks, credits = _plan_credits(input_text, model)
+        with trace.span("credit_deduction"):
+            reservation, message = reserve_credits(user_email, credits)
+        if reservation is None:
+            raise Exception(f"Credit deduction failed: {message}")
+
         try:
-            user_prompt = get_user_prompt_text(conn)
-            response = client.messages.create(
-                model= model,
-                max_tokens=1024,
-                system="You are a helpful assistant trained to summarize medical notes or trascription between patent and doctor in french and english. You will be given a raw medical note or conversation transcript. Use Medical abreveations.",
-                messages=[
-                    {"role": "user", "content": f"""{user_prompt}
-
-                    Résumez le texte suivant :
-
-                    {input_text}
-                    """}
-                ]
-            )
-            ai_output_text = "".join(block.text for block in response.content)
-            input_tokens = response.usage.input_tokens
-            output_tokens = response.usage.output_tokens
-            data = {
-                "input_text": input_text,
-                "ai_output_text": ai_output_text,
-                "input_tokens": input_tokens,
-                "output_tokens": output_tokens,
-                "model": model,
-                "tag": tag
-                }
-            response = conn.table("aiusage").insert(data).execute() 
-            return ai_output_text, input_tokens, output_tokens
-        except anthropic.InternalServerError as e:
-            if i < retries - 1 and 'overloaded_error' in str(e):
-                time.sleep(2 ** i)  # Exponential backoff
-                continue
-            else:
-                raise e
-        except Exception as e:
-            raise e
+            summary_input = _reduce_input(chunks, model, tag, trace)
+            used, ai_output_text, usage = run(_complete(
+                model, _system_prompt, user_prompt, _summary_request(summary_input), tag
+            ))
+        except Exception:
+            # No summary was produced
+            release_reservation(reservation)
+            raise
+        commit_reservation(reservation)
+        trace.record("llm", usage["latency_ms"], model=used)
+        _log_usage(model=used, tag=tag, trace_id=trace.trace_id, **token_counts, **usage)
+        _result_cache().set(cache_key, ai_output_text)
+    finally:
+        _release(cache_key)
+    if own_trace:
+        trace.finish()
+    return ai_output_text, usage["input_tokens"], usage["output_tokens"]
 
+def stream_summarize(input_text, model, tag, usage=None, trace=None, compact=False, user_email=None, user_prompt=None):
+    """Stream the summary chunk by chunk, for use with st.write_stream
+    Args:
+        usage: optional dict filled with input_tokens/output_tokens once the stream ends
+        trace: optional Trace of the whole request, finished by the caller; one is created otherwise
+        compact: remove disfluencies first, for speech transcripts
+        user_email, user_prompt: the user to charge and their prompt, both given
+            when running outside a session (background jobs); the session's otherwise
+    """
+    own_trace = trace is None
+    trace = trace or Trace(tag, model)
+    input_text, token_counts = _prepare_input(input_text, compact, trace)
 
+    user_email, user_prompt = _user_and_prompt(user_email, user_prompt, trace)
+    cache_key = _result_key(input_text, user_prompt, model, user_email)
+    cached = _claim(cache_key)
+    if cached is not None:
+        # Same note, prompt, model and user as a recent or running request: no new call, no credit
+        if usage is not None:
+            usage.update(input_tokens=0, output_tokens=0)
+        if own_trace:
+            trace.finish()
+        yield cached
+        return
 
+    try:
+        chunks, credits = _plan_credits(input_text, model)
+        with trace.span("credit_deduction"):
+            reservation, message = reserve_credits(user_email, credits)
+        if reservation is None:
+            raise Exception(f"Credit deduction failed: {message}")
+
+        stream_usage = {}
+        used = {"model": model}
+        ttft_ms = None
+        try:
+            summary_input = _reduce_input(chunks, model, tag, trace)
+            parts = []
+            start = time.perf_counter()
+            for text in iterate(stream_with_failover(
+                model, provider_name,
+                lambda candidate: get_provider(candidate).stream(
+                    candidate, _system_prompt(candidate), user_prompt, _summary_request(summary_input), tag, stream_usage
+                ),
+                used
+            )):
+                if ttft_ms is None:
+                    ttft_ms = round((time.perf_counter() - start) * 1000)
+                    trace.record("llm_first_token", ttft_ms, model=used["model"])
+                parts.append(text)
+                yield text
+        except GeneratorExit:
+            # The page stopped reading (rerun or navigation) after text was shown
+            commit_reservation(reservation)
+            raise
+        except Exception:
+            # The summary did not complete
+            release_reservation(reservation)
+            raise
+        commit_reservation(reservation)
+        latency_ms = round((time.perf_counter() - start) * 1000)
+        trace.record("llm", latency_ms, model=used["model"])
 
+        ai_output_text = "".join(parts).strip()
+        _log_usage(model=used["model"], tag=tag,
+                   ttft_ms=ttft_ms, latency_ms=latency_ms, trace_id=trace.trace_id, **token_counts, **stream_usage)
+        _result_cache().set(cache_key, ai_output_text)
+    finally:
+        # Also when the page stops reading: a request waiting on this one then makes its own summary
+        _release(cache_key)
+    if usage is not None:
+        usage.update(input_tokens=stream_usage.get("input_tokens"), output_tokens=stream_usage.get("output_tokens"))
+    if own_trace:
+        trace.finish()
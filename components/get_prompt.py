@@ -1,4 +1,5 @@
 import streamlit as st
+from .cache import TTLCache
 
 DEFAULT_PROMPT = """Étant donné des notes médicales ou une transcription, produisez un résumé concis dans un format médical standard :  
 - Aucune duplication d'information entre les sections.  
@@ -14,6 +15,20 @@ DEFAULT_PROMPT = """Étant donné des notes médicales ou une transcription, pro
 - **Diagnostic/Impression** : Liste.  
 - **Plan d'action** : Liste (inclut toutes les actions ou éléments futurs)."""
 
+@st.cache_resource
+def _prompt_cache():
+    """Process-wide prompt cache shared by all sessions, keyed by email"""
+    return TTLCache(max_entries=500, ttl=900)
+
+def invalidate_user_prompt(user_email):
+    """Drop the cached prompt of a user, to be called after the prompt is saved"""
+    if user_email:
+        _prompt_cache().invalidate(user_email)
+
+def remember_user_prompt(user_email, prompt):
+    """Cache a prompt just loaded from the database, e.g. by the session bootstrap"""
+    _prompt_cache().set(user_email, prompt)
+
 def get_user_prompt_text(conn):
     """
     Get the user's custom prompt or return default if none exists
@@ -26,12 +41,22 @@ def get_user_prompt_text(conn):
     
     if not user_email:
         return DEFAULT_PROMPT
-    
+
+    # Not a copy kept in the session: a prompt saved from another tab or
+    # device invalidates this cache, and every session sees it on the next read
+    cache = _prompt_cache()
+    prompt = cache.get(user_email)
+    if prompt is not None:
+        return prompt
+
     try:
-        response = conn.table("prompts").select("*").eq("email", user_email).execute()
+        response = conn.table("prompts").select("prompt").eq("email", user_email).execute()
         if response.data and response.data[0].get("prompt"):
-            return response.data[0]["prompt"]
-        return DEFAULT_PROMPT
+            prompt = response.data[0]["prompt"]
+        else:
+            prompt = DEFAULT_PROMPT
+        cache.set(user_email, prompt)
+        return prompt
     except Exception as e:
         st.error(f"Error fetching prompt: {str(e)}")
         return DEFAULT_PROMPT
@@ -0,0 +1,257 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+import streamlit as st
+
+JOBS_DB_PATH = os.environ.get("JOBS_DB_PATH", "jobs.sqlite3")
+# Jobs run in lanes, each with its own workers, so short note summaries never
+# wait behind hour-long transcriptions. Within a lane a user runs at most
+# per_user jobs at once, and users take turns: one doctor's 20-file batch
+# does not hold up the others.
+LANES = {
+    "long": {"workers": 4, "per_user": 2},  # Transcriptions
+    "short": {"workers": 4, "per_user": 2},  # Note summaries
+}
+# Seconds a finished job and its result (summaries, transcripts) are kept:
+# long enough to pick them up again after a reload, then deleted
+JOB_RETENTION = 3600
+PURGE_INTERVAL = 60  # Seconds between deletions of expired jobs
+PARTIAL_INTERVAL = 0.5  # Seconds between writes of a streaming job's partial text
+
+FINISHED = ("done", "failed", "interrupted")
+
+_SCHEMA = """
+create table if not exists jobs (
+    id text primary key,
+    email text not null,
+    kind text not null,
+    title text,
+    batch_id text,
+    status text not null,
+    progress real not null default 0,
+    message text,
+    partial text,
+    result text,
+    error text,
+    created_at real not null,
+    updated_at real not null
+);
+create index if not exists jobs_email_idx on jobs (email, kind, created_at);
+"""
+
+class JobStore:
+    """Job records in a local SQLite file, so they outlive reruns, reloads and sessions"""
+
+    def __init__(self, path=JOBS_DB_PATH):
+        self.path = path
+        with self._connect() as db:
+            db.execute("pragma journal_mode=wal")
+            db.executescript(_SCHEMA)
+
+    def _connect(self):
+        # One connection per call, so any thread can use the store
+        db = sqlite3.connect(self.path, timeout=30)
+        db.row_factory = sqlite3.Row
+        # Deleted results are overwritten on disk, not only unlinked
+        db.execute("pragma secure_delete=on")
+        return db
+
+    def create(self, email, kind, title=None, batch_id=None):
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._connect() as db:
+            db.execute(
+                "insert into jobs (id, email, kind, title, batch_id, status, message, created_at, updated_at) "
+                "values (?, ?, ?, ?, ?, 'queued', 'Queued', ?, ?)",
+                (job_id, email, kind, title, batch_id, now, now)
+            )
+        return job_id
+
+    def update(self, job_id, **fields):
+        if "result" in fields:
+            fields["result"] = json.dumps(fields["result"], ensure_ascii=False)
+        fields["updated_at"] = time.time()
+        with self._connect() as db:
+            db.execute(
+                f"update jobs set {', '.join(f'{name} = ?' for name in fields)} where id = ?",
+                (*fields.values(), job_id)
+            )
+
+    def _to_dict(self, row):
+        job = dict(row)
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def get(self, job_id):
+        with self._connect() as db:
+            row = db.execute("select * from jobs where id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def recent(self, email, kind, since):
+        """A user's jobs of a kind created after since, newest first"""
+        with self._connect() as db:
+            rows = db.execute(
+                "select * from jobs where email = ? and kind = ? and created_at > ? order by created_at desc",
+                (email, kind, since)
+            ).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def purge(self, retention=JOB_RETENTION):
+        """Delete the jobs that finished more than retention seconds ago"""
+        with self._connect() as db:
+            db.execute(
+                "delete from jobs where status in ('done', 'failed', 'interrupted') and updated_at < ?",
+                (time.time() - retention,)
+            )
+
+    def recover(self):
+        """On startup: mark jobs of a previous process as interrupted and drop expired ones"""
+        with self._connect() as db:
+            db.execute(
+                "update jobs set status = 'interrupted', error = 'The server restarted before the job finished', "
+                "updated_at = ? where status not in ('done', 'failed', 'interrupted')",
+                (time.time(),)
+            )
+        self.purge()
+
+    def start_purging(self, interval=PURGE_INTERVAL):
+        """Purge expired jobs every interval seconds from a daemon thread, whether or not new jobs come in"""
+        def _loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.purge()
+                except sqlite3.Error as e:
+                    print(f"Job purge failed: {str(e)}")  # For server-side logging
+        threading.Thread(target=_loop, name="job-purge", daemon=True).start()
+
+class JobHandle:
+    """What a running job uses to report its progress"""
+
+    def __init__(self, store, job_id):
+        self.store = store
+        self.id = job_id
+        self._last_partial = 0.0
+
+    def progress(self, fraction, message):
+        self.store.update(self.id, progress=fraction, message=message)
+
+    def partial(self, text, force=False):
+        """Text produced so far, e.g. a summary being streamed; written at most every PARTIAL_INTERVAL"""
+        now = time.monotonic()
+        if force or now - self._last_partial >= PARTIAL_INTERVAL:
+            self._last_partial = now
+            self.store.update(self.id, partial=text)
+
+class JobLane:
+    """Worker pool of a lane, fed fairly from one queue per user
+
+    Jobs are only handed to the pool when a worker is free, so the pool
+    never queues: the next job is picked when one ends, from the next user
+    in turn who is under the per-user limit.
+    """
+
+    def __init__(self, name, workers, per_user):
+        self.workers = workers
+        self.per_user = per_user
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"job-{name}")
+        self._lock = threading.Lock()
+        self._queues = OrderedDict()  # email -> deque of callables, users in turn order
+        self._running = Counter()
+
+    def submit(self, email, task):
+        with self._lock:
+            self._queues.setdefault(email, deque()).append(task)
+            self._dispatch()
+
+    def _dispatch(self):
+        # Called with the lock held
+        while sum(self._running.values()) < self.workers:
+            email = next((e for e in self._queues if self._running[e] < self.per_user), None)
+            if email is None:
+                return
+            queue = self._queues.pop(email)
+            task = queue.popleft()
+            if queue:
+                # Back of the line for the user's next job
+                self._queues[email] = queue
+            self._running[email] += 1
+            self._pool.submit(self._run, email, task)
+
+    def _run(self, email, task):
+        try:
+            task()
+        finally:
+            with self._lock:
+                self._running[email] -= 1
+                self._dispatch()
+
+@st.cache_resource
+def _job_runner():
+    """Job store and lanes shared by all sessions, created once per process"""
+    store = JobStore()
+    store.recover()
+    store.start_purging()
+    return store, {name: JobLane(name, **lane) for name, lane in LANES.items()}
+
+def _run_job(store, job_id, fn, args):
+    handle = JobHandle(store, job_id)
+    store.update(job_id, status="running", message="Starting...")
+    try:
+        result = fn(handle, *args)
+        # The result holds the final text, the partial one is not needed any more
+        store.update(job_id, status="done", progress=1.0, message="Done", result=result, partial=None)
+    except Exception as e:
+        store.update(job_id, status="failed", message=f"Failed: {str(e)}", error=str(e), partial=None)
+        print(f"Job {job_id} failed: {str(e)}")  # For server-side logging
+
+def submit_job(email, kind, fn, *args, title=None, batch_id=None, lane="long"):
+    """Queue fn(handle, *args) in a lane and record it
+    The job keeps running whatever happens to the session that started it.
+    fn must not use the session (st.experimental_user, session_state, widgets):
+    pass it the user's email and prompt instead. Its return value, which must
+    be JSON serializable, is stored as the job result for JOB_RETENTION.
+    Args:
+        lane: "long" for transcriptions, "short" for jobs of a few seconds
+    Returns:
+        str: job id
+    """
+    store, lanes = _job_runner()
+    job_id = store.create(email, kind, title=title, batch_id=batch_id)
+    lanes[lane].submit(email, lambda: _run_job(store, job_id, fn, args))
+    return job_id
+
+def get_job(job_id):
+    """Current record of a job as a dict, None if unknown or expired"""
+    return _job_runner()[0].get(job_id) if job_id else None
+
+def recent_jobs(email, kind, max_age=JOB_RETENTION):
+    """A user's jobs of a kind from the last max_age seconds, newest first"""
+    return _job_runner()[0].recent(email, kind, time.time() - max_age)
+
+def is_finished(job):
+    """Whether there is nothing more to wait for: the job ended, or its record expired"""
+    return job is None or job["status"] in FINISHED
+
+def watch_jobs(job_ids, render, interval=1.0, on_finished=None):
+    """Draw jobs with render(jobs), redrawn every interval seconds while one is unfinished
+    Only this part of the page reruns while polling. When the last job
+    finishes, on_finished is called and the whole page reruns once.
+    """
+    active = not all(is_finished(get_job(job_id)) for job_id in job_ids)
+
+    @st.fragment(run_every=interval if active else None)
+    def _watch():
+        jobs = [get_job(job_id) for job_id in job_ids]
+        render(jobs)
+        if active and all(is_finished(job) for job in jobs):
+            if on_finished:
+                on_finished()
+            st.rerun()
+
+    _watch()
@@ -0,0 +1,176 @@
+import threading
+from abc import ABC, abstractmethod
+import av
+import streamlit as st
+from .available_credits import reserve_credits, commit_reservation, release_reservation
+
+SAMPLE_RATE = 16000
+BYTES_PER_SECOND = SAMPLE_RATE * 2  # 16-bit mono PCM
+LIVE_SESSION_CREDITS = 1  # Charged when a realtime transcription session opens
+
+class RealtimeBackend(ABC):
+    """Realtime transcription backend fed with 16 kHz mono 16-bit PCM
+
+    Implementations keep the finished turns in order and the turn being
+    spoken as a partial, both readable through the text property while
+    audio is still being sent.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._turns = []
+        self._partial = ""
+
+    @property
+    def text(self):
+        """Transcript so far, including the turn being spoken"""
+        with self._lock:
+            return " ".join(self._turns + ([self._partial] if self._partial else []))
+
+    def _on_partial(self, text):
+        with self._lock:
+            self._partial = text
+
+    def _on_final(self, text):
+        with self._lock:
+            if text:
+                self._turns.append(text)
+            self._partial = ""
+
+    @abstractmethod
+    def start(self):
+        """Open the session"""
+
+    @abstractmethod
+    def send_audio(self, pcm):
+        """Send raw PCM bytes"""
+
+    @abstractmethod
+    def stop(self):
+        """Close the session, wait for the last turn and return the full transcript"""
+
+class AssemblyAIRealtimeBackend(RealtimeBackend):
+    """AssemblyAI streaming speech-to-text over a websocket
+
+    Uses the multilingual model with language detection: most consults are
+    in French, which the default English-only model does not transcribe.
+    """
+
+    # The service wants chunks between 50 and 1000 ms
+    MIN_CHUNK_BYTES = BYTES_PER_SECOND // 10
+
+    def __init__(self, api_key):
+        super().__init__()
+        self.api_key = api_key
+        self._client = None
+        self._buffer = bytearray()
+        self.error = None
+
+    def start(self):
+        from assemblyai.streaming.v3 import (
+            SpeechModel, StreamingClient, StreamingClientOptions, StreamingEvents, StreamingParameters
+        )
+        self._client = StreamingClient(StreamingClientOptions(api_key=self.api_key))
+        self._client.on(StreamingEvents.Turn, self._handle_turn)
+        self._client.on(StreamingEvents.Error, self._handle_error)
+        self._client.connect(StreamingParameters(
+            sample_rate=SAMPLE_RATE,
+            format_turns=True,
+            speech_model=SpeechModel.universal_streaming_multilingual,
+            language_detection=True
+        ))
+
+    def _handle_turn(self, client, event):
+        # A finished turn is sent once raw, then once formatted: keep the formatted one
+        if event.end_of_turn and event.turn_is_formatted:
+            self._on_final(event.transcript)
+        elif not event.end_of_turn:
+            self._on_partial(event.transcript)
+
+    def _handle_error(self, client, error):
+        self.error = error
+        print(f"Realtime transcription error: {error}")  # For server-side logging
+
+    def send_audio(self, pcm):
+        self._buffer.extend(pcm)
+        if len(self._buffer) >= self.MIN_CHUNK_BYTES:
+            self._client.stream(bytes(self._buffer))
+            self._buffer.clear()
+
+    def stop(self):
+        if self._client is not None:
+            if self._buffer:
+                self._client.stream(bytes(self._buffer))
+                self._buffer.clear()
+            self._client.disconnect(terminate=True)
+            self._client = None
+        return self.text
+
+class LocalRealtimeBackend(RealtimeBackend):
+    """Offline stand-in that emits scripted turns as audio arrives
+
+    Each turn of the script is released once seconds_per_turn of audio
+    has been received, so tests and local runs exercise the same flow
+    without network access.
+    """
+
+    def __init__(self, script=None, seconds_per_turn=2.0):
+        super().__init__()
+        self.script = list(script or ["Local transcription stand-in."])
+        self.seconds_per_turn = seconds_per_turn
+        self.received_bytes = 0
+
+    def start(self):
+        self.received_bytes = 0
+
+    def send_audio(self, pcm):
+        self.received_bytes += len(pcm)
+        turns_due = int(self.received_bytes / BYTES_PER_SECOND / self.seconds_per_turn)
+        while len(self._turns) < min(turns_due, len(self.script)):
+            self._on_final(self.script[len(self._turns)])
+
+    def stop(self):
+        return self.text
+
+def create_backend(name, api_key=None):
+    """Build a backend by name: "assemblyai" or "local" """
+    if name == "local":
+        return LocalRealtimeBackend()
+    return AssemblyAIRealtimeBackend(api_key)
+
+def start_live_session(user_email):
+    """Open a realtime transcription session once its credit is taken
+    The backend is the LIVE_TRANSCRIPTION_BACKEND secret, AssemblyAI by default.
+    Returns:
+        RealtimeBackend, or None when the user has no credit left or the session failed to open
+    """
+    reservation, message = reserve_credits(user_email, LIVE_SESSION_CREDITS)
+    if reservation is None:
+        st.error(f"Live transcription needs {LIVE_SESSION_CREDITS} credit: {message}")
+        return None
+    backend = create_backend(
+        st.secrets.get("LIVE_TRANSCRIPTION_BACKEND", "assemblyai"),
+        api_key=st.secrets.get("ASSEMBLYAI")
+    )
+    try:
+        backend.start()
+    except Exception as e:
+        release_reservation(reservation)
+        st.error(f"Could not start live transcription: {str(e)}")
+        print(f"Live transcription start failed: {str(e)}")  # For server-side logging
+        return None
+    commit_reservation(reservation)
+    return backend
+
+class FrameConverter:
+    """Convert WebRTC audio frames (48 kHz, often stereo) to 16 kHz mono PCM"""
+
+    def __init__(self):
+        self._resampler = av.AudioResampler(format="s16", layout="mono", rate=SAMPLE_RATE)
+
+    def convert(self, frames):
+        pcm = bytearray()
+        for frame in frames:
+            for out in self._resampler.resample(frame):
+                pcm.extend(out.to_ndarray().tobytes())
+        return bytes(pcm)
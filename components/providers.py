@@ -0,0 +1,161 @@
+import asyncio
+import importlib
+import threading
+import httpx
+import streamlit as st
+
+OPENAI_MODELS = ["chatgpt-4o-latest", "gpt-4o-mini", "o1-mini"]
+MAX_OUTPUT_TOKENS = 1024
+
+# The openai and anthropic SDKs take about a second each to import, so they
+# are imported by the first summary that needs them, not with the pages.
+# One connection pool per provider for every session of the process.
+# Keep-alive and HTTP/2 let concurrent requests share a few warm connections.
+POOL_LIMITS = {"max_connections": 100, "max_keepalive_connections": 20, "keepalive_expiry": 120}
+POOL_TIMEOUT = {"timeout": 120.0, "connect": 10.0}
+
+@st.cache_resource
+def _event_loop():
+    """Event loop running in a daemon thread, shared by all Streamlit script threads"""
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name="provider-loop", daemon=True).start()
+    return loop
+
+def httpx_module(client_class):
+    """httpx or httpx2, whichever an SDK's HTTP client class is built on
+    Recent anthropic releases use httpx2 and reject plain httpx clients.
+    """
+    return httpx if issubclass(client_class, httpx.AsyncClient) else importlib.import_module("httpx2")
+
+@st.cache_resource
+def _http_client(provider):
+    """Pooled HTTP/2 client for one provider ("openai" or "anthropic", also the SDK module), of the class its SDK expects"""
+    client_class = importlib.import_module(provider).DefaultAsyncHttpxClient
+    http = httpx_module(client_class)
+    return client_class(http2=True, limits=http.Limits(**POOL_LIMITS), timeout=http.Timeout(**POOL_TIMEOUT))
+
+def run(coro):
+    """Run a coroutine on the shared loop and block the calling thread until it is done"""
+    return asyncio.run_coroutine_threadsafe(coro, _event_loop()).result()
+
+def iterate(agen):
+    """Turn an async generator running on the shared loop into a regular generator"""
+    try:
+        while True:
+            try:
+                yield run(agen.__anext__())
+            except StopAsyncIteration:
+                return
+    finally:
+        run(agen.aclose())
+
+class OpenAIProvider:
+    """Chat completions, laid out for OpenAI's automatic prefix caching"""
+
+    def __init__(self, client):
+        self.client = client
+
+    def _request(self, model, system, prefix, content, tag):
+        # Static prefix first (system, then the user's prompt), the note last
+        messages = [{"role": "system", "content": system}]
+        if prefix:
+            messages.append({"role": "user", "content": prefix})
+        messages.append({"role": "user", "content": content})
+        return {
+            "model": model,
+            "store": True,
+            "metadata": {"category": tag},
+            "top_p": 0.2,
+            "messages": messages,
+            "max_tokens": MAX_OUTPUT_TOKENS,
+        }
+
+    @staticmethod
+    def _usage(usage):
+        details = getattr(usage, "prompt_tokens_details", None)
+        return {
+            "input_tokens": usage.prompt_tokens,
+            "output_tokens": usage.completion_tokens,
+            "cached_input_tokens": (getattr(details, "cached_tokens", None) or 0) if details else 0,
+        }
+
+    async def complete(self, model, system, prefix, content, tag):
+        """Returns:
+            tuple: (text, usage) - usage holds the token counts for aiusage
+        """
+        completion = await self.client.chat.completions.create(**self._request(model, system, prefix, content, tag))
+        return completion.choices[0].message.content.strip(), self._usage(completion.usage)
+
+    async def stream(self, model, system, prefix, content, tag, usage):
+        """Yield text chunks, then fill the usage dict from the last chunk"""
+        stream = await self.client.chat.completions.create(
+            **self._request(model, system, prefix, content, tag),
+            stream=True,
+            stream_options={"include_usage": True},
+        )
+        async for chunk in stream:
+            # The last chunk carries the usage and no choices
+            if chunk.usage:
+                usage.update(self._usage(chunk.usage))
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+class AnthropicProvider:
+    """Messages API, with a cache_control breakpoint after the user's prompt"""
+
+    def __init__(self, client):
+        self.client = client
+
+    def _request(self, model, system, prefix, content):
+        blocks = []
+        if prefix:
+            # Caches system + user's prompt, which are the same on every call
+            blocks.append({"type": "text", "text": prefix, "cache_control": {"type": "ephemeral"}})
+        blocks.append({"type": "text", "text": content})
+        return {
+            "model": model,
+            "max_tokens": MAX_OUTPUT_TOKENS,
+            "system": system,
+            "messages": [{"role": "user", "content": blocks}],
+        }
+
+    @staticmethod
+    def _usage(usage):
+        return {
+            "input_tokens": usage.input_tokens,
+            "output_tokens": usage.output_tokens,
+            "cached_input_tokens": usage.cache_read_input_tokens or 0,
+            "cache_creation_input_tokens": usage.cache_creation_input_tokens or 0,
+        }
+
+    async def complete(self, model, system, prefix, content, tag):
+        """Returns:
+            tuple: (text, usage) - usage holds the token counts for aiusage
+        """
+        response = await self.client.messages.create(**self._request(model, system, prefix, content))
+        return "".join(block.text for block in response.content), self._usage(response.usage)
+
+    async def stream(self, model, system, prefix, content, tag, usage):
+        """Yield text chunks, then fill the usage dict from the final message"""
+        async with self.client.messages.stream(**self._request(model, system, prefix, content)) as stream:
+            async for text in stream.text_stream:
+                yield text
+            response = await stream.get_final_message()
+        usage.update(self._usage(response.usage))
+
+@st.cache_resource
+def _openai_provider():
+    from openai import AsyncOpenAI
+    return OpenAIProvider(AsyncOpenAI(api_key=st.secrets["OPENAI_API_KEY"], http_client=_http_client("openai")))
+
+@st.cache_resource
+def _anthropic_provider():
+    from anthropic import AsyncAnthropic
+    return AnthropicProvider(AsyncAnthropic(api_key=st.secrets["Claude_API_KEY"], http_client=_http_client("anthropic")))
+
+def provider_name(model):
+    return "openai" if model in OPENAI_MODELS else "anthropic"
+
+def get_provider(model):
+    """Provider serving a model, created on first use"""
+    return _openai_provider() if provider_name(model) == "openai" else _anthropic_provider()
@@ -1,13 +1,20 @@
+import time
 import streamlit as st
-import stripe
-from components.available_credits import add_credits, get_user_credits
+from components.available_credits import get_user_credits, invalidate_user_credits
 
-# Initialize Stripe with the API key from Streamlit secrets
-stripe.api_key = st.secrets["STRIPE_SECRET_KEY"]
+PURCHASE_POLL_INTERVAL = 2  # Seconds between balance checks while the payment is being granted
+PURCHASE_POLL_TIMEOUT = 60  # Seconds after the redirect the balance is checked for
+
+@st.cache_resource
+def _stripe():
+    """Stripe SDK, imported and given the API key from Streamlit secrets on the first checkout"""
+    import stripe
+    stripe.api_key = st.secrets["STRIPE_SECRET_KEY"]
+    return stripe
 
 def create_checkout_session(user_email):
     try:
-        checkout_session = stripe.checkout.Session.create(
+        checkout_session = _stripe().checkout.Session.create(
             payment_method_types=['card'],
             line_items=[{
                 'price_data': {
@@ -31,12 +38,40 @@ def create_checkout_session(user_email):
         st.error(f"Error creating checkout session: {str(e)}")
         return None
 
+def _await_purchase(user_email):
+    """Re-query the balance until the webhook has granted the purchase
+    The redirect usually arrives before the webhook, so the balance read
+    then is the one from before the payment. Once it changes, or after
+    PURCHASE_POLL_TIMEOUT, the whole page reruns to show it.
+    """
+    @st.fragment(run_every=PURCHASE_POLL_INTERVAL)
+    def _poll():
+        balance_before, redirected_at = st.session_state.purchase_pending
+        invalidate_user_credits(user_email)
+        if get_user_credits(user_email) != balance_before or time.time() - redirected_at > PURCHASE_POLL_TIMEOUT:
+            del st.session_state.purchase_pending
+            st.rerun()
+        st.info("Checking for your new credits...")
+
+    _poll()
+
 def purchase_credits_section():
     """Display the purchase credits section"""
     user_info = st.experimental_user
     
     if user_info and user_info.is_logged_in:
         user_email = user_info.email
+
+        # Credits are granted by the Stripe webhook service (webhook_handler.py),
+        # the redirect only tells the user and watches the balance for them
+        if st.query_params.get("success") == "true":
+            st.query_params.clear()
+            st.session_state.purchase_pending = (get_user_credits(user_email), time.time())
+            st.success("Payment successful! Your 300 credits will appear in your balance shortly.")
+            st.balloons()
+        if "purchase_pending" in st.session_state:
+            _await_purchase(user_email)
+
         current_credits = get_user_credits(user_email)
         
         st.write("### Purchase Credits")
@@ -47,23 +82,5 @@ def purchase_credits_section():
             checkout_session = create_checkout_session(user_email)
             if checkout_session:
                 st.markdown(f'<a href="{checkout_session.url}" target="_blank">Click here to make payment</a>', unsafe_allow_html=True)
-        
-        # Initialize session state for tracking credit addition
-        if 'credits_added' not in st.session_state:
-            st.session_state.credits_added = False
-        
-        # Handle successful payment
-        if st.query_params.get("success") == "true" and not st.session_state.credits_added:
-            success, message = add_credits(user_email, 300)
-            if success:
-                st.success("Payment successful! 300 credits have been added to your account.")
-                st.balloons()
-                # Mark credits as added in session state
-                st.session_state.credits_added = True
-                # Clear the success parameter by creating new query params without 'success'
-                st.query_params.clear()
-                
-            else:
-                st.error(f"Error adding credits: {message}")
     else:
         st.warning("Please login to purchase credits")
@@ -0,0 +1,175 @@
+import asyncio
+import random
+import sys
+import threading
+import time
+import streamlit as st
+
+# Errors worth retrying or failing over on: overload, rate limits, 5xx and network
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504, 529}
+RETRIES = 3
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 4.0
+
+# Model to fall back to when the provider of the requested one is failing.
+# Overridden by a [FAILOVER] table in the secrets.
+DEFAULT_FAILOVER = {
+    "claude-3-5-sonnet-latest": "gpt-4o-mini",
+    "claude-3-5-haiku-latest": "gpt-4o-mini",
+    "gpt-4o-mini": "claude-3-5-haiku-latest",
+    "chatgpt-4o-latest": "claude-3-5-sonnet-latest",
+}
+
+class CircuitOpenError(Exception):
+    """Raised when every candidate model sits behind an open circuit"""
+
+class CircuitBreaker:
+    """Per-provider breaker shared by all sessions
+
+    Opens after failure_threshold consecutive transient failures, so calls
+    skip the provider for reset_timeout seconds. Then one trial call is let
+    through (half-open): success closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self):
+        """Whether a call may go to the provider now"""
+        with self._lock:
+            state = self._state()
+            if state == "closed":
+                return True
+            if state == "half-open" and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial_running or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+                print(f"Circuit opened for {self.name} after {self._failures} failure(s)")  # For server-side logging
+            self._trial_running = False
+
+@st.cache_resource
+def _breakers():
+    return {}
+
+def get_breaker(name):
+    """Process-wide breaker for a provider"""
+    return _breakers().setdefault(name, CircuitBreaker(name))
+
+def is_transient(error):
+    # Only an SDK already imported can have raised the error, and importing the other one is slow
+    connection_errors = tuple(sys.modules[sdk].APIConnectionError for sdk in ("anthropic", "openai") if sdk in sys.modules)
+    if isinstance(error, connection_errors):
+        return True
+    return getattr(error, "status_code", None) in RETRYABLE_STATUS or "overloaded_error" in str(error)
+
+def backoff_delay(attempt):
+    """Exponential backoff with full jitter, so retries from many sessions spread out"""
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+
+def failover_chain(model):
+    """Requested model first, then its fallbacks, without loops"""
+    failover = {**DEFAULT_FAILOVER, **st.secrets.get("FAILOVER", {})}
+    chain = [model]
+    while failover.get(chain[-1]) and failover[chain[-1]] not in chain:
+        chain.append(failover[chain[-1]])
+    return chain
+
+async def call_with_failover(model, provider_of, call):
+    """Run call(model) with retries, failing over along the chain when a provider is down
+    Args:
+        provider_of: callable(model) -> provider name used to pick the breaker
+        call: callable(model) -> awaitable
+    Returns:
+        tuple: (model actually used, result)
+    """
+    last_error = None
+    for candidate in failover_chain(model):
+        breaker = get_breaker(provider_of(candidate))
+        for attempt in range(RETRIES):
+            if not breaker.allow():
+                break
+            try:
+                result = await call(candidate)
+            except Exception as e:
+                if not is_transient(e):
+                    # Not a provider outage (bad request, auth...): failing over would not help
+                    breaker.record_success()
+                    raise
+                breaker.record_failure()
+                last_error = e
+                if attempt < RETRIES - 1:
+                    await asyncio.sleep(backoff_delay(attempt))
+                continue
+            breaker.record_success()
+            return candidate, result
+    raise last_error or CircuitOpenError(f"All providers are unavailable for {model}")
+
+async def stream_with_failover(model, provider_of, open_stream, used=None):
+    """Like call_with_failover for async generators, failing over until the first chunk
+    Errors after the first chunk are raised as is, since text was already shown.
+    Args:
+        open_stream: callable(model) -> async generator
+        used: optional dict, its "model" key is set to the model that answered
+    """
+    last_error = None
+    for candidate in failover_chain(model):
+        breaker = get_breaker(provider_of(candidate))
+        for attempt in range(RETRIES):
+            if not breaker.allow():
+                break
+            stream = open_stream(candidate)
+            try:
+                first = await stream.__anext__()
+            except StopAsyncIteration:
+                breaker.record_success()
+                if used is not None:
+                    used["model"] = candidate
+                return
+            except Exception as e:
+                await stream.aclose()
+                if not is_transient(e):
+                    breaker.record_success()
+                    raise
+                breaker.record_failure()
+                last_error = e
+                if attempt < RETRIES - 1:
+                    await asyncio.sleep(backoff_delay(attempt))
+                continue
+            breaker.record_success()
+            if used is not None:
+                used["model"] = candidate
+            yield first
+            async for chunk in stream:
+                yield chunk
+            return
+    raise last_error or CircuitOpenError(f"All providers are unavailable for {model}")
@@ -0,0 +1,73 @@
+from .generate_summary import stream_summarize
+from .transcription import transcribe_long_audio
+from .tracing import Trace
+
+# Background jobs of the Notes and Audio pages, run by components.jobs.
+# They get the user's email and prompt as arguments since they run
+# outside the session, and return JSON serializable results.
+
+AUDIO_MODEL = "claude-3-5-sonnet-latest"
+
+def _stream_into_job(job, input_text, model, tag, trace, user_email, user_prompt, compact=False):
+    """Stream a summary, writing the text so far to the job record
+    Returns:
+        tuple: (summary, usage dict)
+    """
+    usage = {}
+    parts = []
+    for text in stream_summarize(input_text, model, tag, usage, trace=trace, compact=compact,
+                                 user_email=user_email, user_prompt=user_prompt):
+        parts.append(text)
+        job.partial("".join(parts))
+    job.partial("".join(parts), force=True)
+    return "".join(parts).strip(), usage
+
+def notes_summary_job(job, input_text, model, user_email, user_prompt):
+    """Summarize a note
+    Returns:
+        dict: summary, input_tokens, output_tokens
+    """
+    trace = Trace("Handwritten", model)
+    job.progress(0.1, "Summarizing...")
+    summary, usage = _stream_into_job(job, input_text, model, "Handwritten", trace, user_email, user_prompt)
+    trace.finish()
+    return {"summary": summary, "input_tokens": usage.get("input_tokens"), "output_tokens": usage.get("output_tokens")}
+
+def audio_summary_job(job, audio_file, config, tag, user_email, user_prompt):
+    """Transcribe a recording and summarize the transcript
+    Args:
+        audio_file: the uploaded file, a seekable file-like object in any format av can decode,
+            read only now that the job runs
+        config: aai.TranscriptionConfig
+    Returns:
+        dict: summary, transcript, language, minutes_saved by silence trimming
+    """
+    trace = Trace(tag, AUDIO_MODEL)
+    audio_stats = {}
+    fraction = 0.05
+    job.progress(fraction, "Preparing audio...")
+
+    # Transcription takes the first 80% of the progress, one step per segment
+    def on_segment(done, total):
+        nonlocal fraction
+        fraction = 0.8 * done / total
+        job.progress(fraction, f"Transcribed segment {done}/{total}")
+
+    def on_upload(sent, total):
+        job.progress(fraction, f"Uploaded {sent / 1e6:.1f} of {total / 1e6:.1f} MB")
+
+    transcript_text, detected_language = transcribe_long_audio(
+        audio_file, config,
+        on_progress=on_segment,
+        trace=trace,
+        stats=audio_stats,
+        on_upload_progress=on_upload
+    )
+    if not transcript_text:
+        raise ValueError("No transcription text received from AssemblyAI")
+
+    job.progress(0.8, "Summarizing...")
+    summary, _ = _stream_into_job(job, transcript_text, AUDIO_MODEL, tag, trace, user_email, user_prompt, compact=True)
+    trace.finish()
+    return {"summary": summary, "transcript": transcript_text, "language": detected_language,
+            "minutes_saved": audio_stats["removed_ms"] / 60000}
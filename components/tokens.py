@@ -0,0 +1,41 @@
+import math
+import re
+
+# Rough average for French and English medical text, on the high side so
+# estimates err towards more tokens than the provider tokenizers count
+CHARS_PER_TOKEN = 3.5
+
+def estimate_tokens(text):
+    """Estimate the token count of a text without calling a tokenizer"""
+    return math.ceil(len(text) / CHARS_PER_TOKEN) if text else 0
+
+def split_by_tokens(text, max_tokens):
+    """Split text into chunks of at most max_tokens estimated tokens
+    Cuts at line breaks first, then at sentence ends, and only splits inside
+    a sentence when a single sentence is over the budget.
+    Returns:
+        list: chunks in original order
+    """
+    max_chars = int(max_tokens * CHARS_PER_TOKEN)
+    if len(text) <= max_chars:
+        return [text]
+
+    units = []
+    for line in text.splitlines(keepends=True):
+        if len(line) <= max_chars:
+            units.append(line)
+            continue
+        for sentence in re.split(r"(?<=[.!?])\s+", line):
+            step = max_chars - 1  # Leave room for the separating space
+            units.extend(sentence[i:i + step] + " " for i in range(0, len(sentence), step))
+
+    chunks = []
+    current = ""
+    for unit in units:
+        if current and len(current) + len(unit) > max_chars:
+            chunks.append(current.strip())
+            current = ""
+        current += unit
+    if current.strip():
+        chunks.append(current.strip())
+    return chunks
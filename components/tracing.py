@@ -0,0 +1,61 @@
+import threading
+import time
+import uuid
+from contextlib import contextmanager, nullcontext
+from .usage_writer import get_span_writer
+
+class Trace:
+    """Stage timings of one request, from the audio upload to the aiusage row
+
+    Every span is queued for the trace_spans table under the trace id,
+    which is also stored on the request's aiusage rows. Spans may be
+    recorded from worker threads, e.g. one upload span per audio segment.
+    """
+
+    def __init__(self, tag, model=None):
+        self.trace_id = uuid.uuid4().hex
+        self.tag = tag
+        self.model = model
+        self.durations = {}
+        self._started = time.perf_counter()
+        self._finished = False
+        self._lock = threading.Lock()
+        # Resolved on the creating thread, workers may have no script context
+        self._writer = get_span_writer()
+
+    def elapsed_ms(self):
+        """Milliseconds since the trace started"""
+        return round((time.perf_counter() - self._started) * 1000)
+
+    @contextmanager
+    def span(self, stage, model=None):
+        """Time the enclosed block as one span of the stage, even if it raises"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, (time.perf_counter() - start) * 1000, model)
+
+    def record(self, stage, duration_ms, model=None):
+        """Add a span measured elsewhere, in milliseconds"""
+        with self._lock:
+            self.durations[stage] = self.durations.get(stage, 0) + duration_ms
+        self._writer.enqueue({
+            "trace_id": self.trace_id,
+            "stage": stage,
+            "model": model or self.model,
+            "tag": self.tag,
+            "duration_ms": round(duration_ms),
+        })
+
+    def finish(self):
+        """Record the end-to-end "total" span, once"""
+        with self._lock:
+            if self._finished:
+                return
+            self._finished = True
+        self.record("total", self.elapsed_ms())
+
+def span(trace, stage, model=None):
+    """trace.span(stage), or a no-op when no trace is given"""
+    return trace.span(stage, model) if trace is not None else nullcontext()
@@ -0,0 +1,189 @@
+import io
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pydub.silence import detect_silence
+from .audio import encode_audio
+from .resilience import backoff_delay, is_transient
+from .vad import trim_silence
+from .tracing import span
+
+SEGMENT_TARGET_MS = 5 * 60 * 1000  # Aim for 5 minute segments
+SEGMENT_SEARCH_MS = 30 * 1000  # Look for a silence up to 30 s around each cut
+MIN_SILENCE_MS = 700
+MAX_WORKERS = 4
+SEGMENT_ATTEMPTS = 4  # Per segment, for the upload and again for the transcription
+UPLOAD_PROGRESS_STEP = 512 * 1024  # Bytes between two upload progress reports
+
+def split_at_silence(audio, target_ms=SEGMENT_TARGET_MS, search_ms=SEGMENT_SEARCH_MS):
+    """Find segment boundaries close to every target_ms, cutting inside a silence
+    Args:
+        audio: pydub AudioSegment
+    Returns:
+        list: (start_ms, end_ms) tuples covering the whole recording
+    """
+    # Silence is relative to the recording loudness, with a floor for near-silent files
+    silence_thresh = audio.dBFS - 16 if audio.dBFS != float("-inf") else -50
+
+    bounds = []
+    start = 0
+    # Stop cutting when what is left fits in two targets, so the last segment is never tiny
+    while len(audio) - start > 2 * target_ms:
+        window_start = start + target_ms - search_ms
+        window = audio[window_start:start + target_ms + search_ms]
+        silences = detect_silence(window, min_silence_len=MIN_SILENCE_MS, silence_thresh=silence_thresh)
+        if silences:
+            # Cut in the middle of the silence closest to the target
+            mid = min(((s + e) // 2 for s, e in silences), key=lambda m: abs(m - search_ms))
+            cut = window_start + mid
+        else:
+            cut = start + target_ms
+        bounds.append((start, cut))
+        start = cut
+    bounds.append((start, len(audio)))
+    return bounds
+
+def _with_retries(step, call):
+    """Run call(), retrying network errors and retryable statuses with backoff
+    A dropped connection then only costs the segment's step, not the recording.
+    """
+    import httpx
+    for attempt in range(SEGMENT_ATTEMPTS):
+        try:
+            return call()
+        except Exception as e:
+            if attempt == SEGMENT_ATTEMPTS - 1 or not (isinstance(e, httpx.TransportError) or is_transient(e)):
+                raise
+            print(f"Segment {step} failed, retrying: {str(e)}")  # For server-side logging
+            time.sleep(backoff_delay(attempt))
+
+class _ProgressReader(io.BytesIO):
+    """In-memory file that reports its read position and size as the HTTP client streams it
+    A retry seeks back to the start, so the report starts over with it.
+    """
+
+    def __init__(self, data, report):
+        super().__init__(data)
+        self._report = report
+        self._size = len(data)
+
+    def read(self, size=-1):
+        chunk = super().read(size)
+        self._report(self.tell(), self._size)
+        return chunk
+
+class _UploadProgress:
+    """Bytes uploaded over all segments, out of their encoded size
+
+    Segments are encoded by the upload workers, so until the last one is
+    encoded the total is estimated from the bytes per ms of those encoded
+    so far, which is close for the app's constant-bitrate formats.
+    """
+
+    def __init__(self, durations_ms, callback):
+        self.callback = callback
+        self._durations = durations_ms
+        self._lock = threading.Lock()
+        self._sent = {}
+        self._sizes = {}
+        self._reported = None
+
+    def _total(self):
+        known_ms = sum(self._durations[index] for index in self._sizes)
+        known = sum(self._sizes.values())
+        return round(known * sum(self._durations) / known_ms) if known_ms else known
+
+    def for_segment(self, index):
+        def report(sent, size):
+            with self._lock:
+                self._sent[index] = sent
+                self._sizes[index] = size
+                sent, total = sum(self._sent.values()), self._total()
+                # Every UPLOAD_PROGRESS_STEP and at the end, not for every read of the HTTP client
+                step = (sent // UPLOAD_PROGRESS_STEP, sent == total)
+                if step == self._reported:
+                    return
+                self._reported = step
+            self.callback(sent, total)
+        return report
+
+def _upload_and_transcribe(data, config, trace=None, on_upload=None):
+    """Stream a file-like object to AssemblyAI and wait for the transcript
+    Upload and transcription are retried separately, and timed as separate
+    spans when a trace is given.
+    Args:
+        on_upload: optional callable(bytes_sent, size) called as the upload advances
+    """
+    import assemblyai as aai
+    transcriber = aai.Transcriber(config=config)
+
+    if on_upload:
+        data = _ProgressReader(data.getbuffer(), on_upload)
+
+    def upload():
+        data.seek(0)
+        return transcriber.upload_file(data)
+
+    with span(trace, "upload"):
+        audio_url = _with_retries("upload", upload)
+    with span(trace, "transcription"):
+        transcript = _with_retries("transcription", lambda: transcriber.transcribe(audio_url))
+    if transcript.status == aai.TranscriptStatus.error:
+        raise ValueError(f"Transcription error: {transcript.error}")
+    return transcript
+
+def _transcribe_segment(segment, config, trace=None, on_upload=None):
+    # Segments are compressed into an in-memory buffer, never to disk
+    return _upload_and_transcribe(encode_audio(segment), config, trace, on_upload)
+
+def transcribe_long_audio(source, config, on_progress=None, max_workers=MAX_WORKERS, trace=None, stats=None,
+                          on_upload_progress=None):
+    """Transcribe a recording as silence-split segments on a bounded thread pool
+    Long non-speech spans are dropped before upload.
+    Args:
+        source: path or file-like object in any format av can decode, e.g. an st.file_uploader file
+        config: aai.TranscriptionConfig applied to every segment
+        on_progress: optional callable(done, total), called on the caller's thread
+        on_upload_progress: optional callable(sent_bytes, total_bytes) over all segments,
+            called from the upload threads
+        trace: optional Trace, gets a decode span and upload/transcription spans per segment
+        stats: optional dict filled with original_ms, removed_ms, the TimeMap of the
+            trimming (time_map) and the (start_ms, end_ms) of every segment in the trimmed audio
+    Returns:
+        tuple: (transcript text, detected language code)
+    """
+    # Streamed, downmixed to 16 kHz mono and trimmed, then each segment is uploaded as Opus
+    with span(trace, "decode"):
+        audio, time_map = trim_silence(source)
+    if not len(audio):
+        raise ValueError("No speech found in the recording")
+    bounds = split_at_silence(audio)
+    total = len(bounds)
+    if stats is not None:
+        # A word at t ms in segment i was said at time_map.to_original(segments[i][0] + t)
+        stats.update(
+            original_ms=len(audio) + time_map.removed_ms,
+            removed_ms=time_map.removed_ms,
+            time_map=time_map,
+            segments=bounds,
+        )
+
+    transcripts = [None] * total
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        upload_progress = None
+        if on_upload_progress:
+            upload_progress = _UploadProgress([end - start for start, end in bounds], on_upload_progress)
+        futures = {
+            pool.submit(_transcribe_segment, audio[start:end], config, trace,
+                        upload_progress.for_segment(index) if upload_progress else None): index
+            for index, (start, end) in enumerate(bounds)
+        }
+        for done, future in enumerate(as_completed(futures), start=1):
+            transcripts[futures[future]] = future.result()
+            if on_progress:
+                on_progress(done, total)
+
+    # Stitch the segments back in recording order
+    text = " ".join(t.text.strip() for t in transcripts if t.text)
+    language = getattr(transcripts[0], "language_code", None) or "unknown"
+    return text, language
@@ -0,0 +1,120 @@
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+import streamlit as st
+from st_supabase_connection import SupabaseConnection
+
+SPILL_PATH = os.environ.get("AIUSAGE_SPILL_PATH", "aiusage_spill.jsonl")
+SPANS_SPILL_PATH = os.environ.get("TRACE_SPANS_SPILL_PATH", "trace_spans_spill.jsonl")
+
+class UsageWriter:
+    """Background writer that batches rows of a table into bulk inserts
+
+    Rows are queued by the summary functions and flushed by a daemon thread
+    when the batch is full or flush_interval seconds have passed. Batches
+    that cannot be inserted are appended to a local JSON lines file and
+    replayed on the next successful flush.
+    """
+
+    def __init__(self, conn, batch_size=20, flush_interval=2.0, spill_path=SPILL_PATH, table="aiusage",
+                 span_writer=None):
+        """
+        Args:
+            span_writer: optional writer for trace_spans, which gets the duration of every insert
+        """
+        self.conn = conn
+        self.table = table
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.spill_path = spill_path
+        self.span_writer = span_writer
+        self._queue = queue.Queue()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"{table}-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def enqueue(self, row):
+        """Queue a row for insertion and return immediately"""
+        self._queue.put(row)
+
+    def close(self):
+        """Stop the flush thread and write whatever is still queued"""
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        self._thread.join(timeout=10)
+        self._flush(self._drain())
+
+    def _drain(self):
+        rows = []
+        while True:
+            try:
+                rows.append(self._queue.get_nowait())
+            except queue.Empty:
+                return rows
+
+    def _run(self):
+        while not self._stop.is_set():
+            batch = []
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size and not self._stop.is_set():
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            self._flush(batch)
+
+    def _flush(self, rows):
+        if rows:
+            start = time.perf_counter()
+            try:
+                self.conn.table(self.table).insert(rows).execute()
+            except Exception as e:
+                print(f"{self.table} insert failed, spilling {len(rows)} row(s) to disk: {str(e)}")  # For server-side logging
+                self._spill(rows)
+                return
+            if self.span_writer is not None:
+                self.span_writer.enqueue({
+                    "stage": f"{self.table}_insert",
+                    "duration_ms": round((time.perf_counter() - start) * 1000),
+                })
+        self._replay_spill()
+
+    def _spill(self, rows):
+        with open(self.spill_path, "a", encoding="utf-8") as f:
+            for row in rows:
+                f.write(json.dumps(row) + "\n")
+
+    def _replay_spill(self):
+        """Insert rows spilled by earlier failed flushes, keeping those that still fail"""
+        if not os.path.exists(self.spill_path):
+            return
+        with open(self.spill_path, encoding="utf-8") as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+        os.remove(self.spill_path)
+        for i in range(0, len(rows), self.batch_size):
+            try:
+                self.conn.table(self.table).insert(rows[i:i + self.batch_size]).execute()
+            except Exception as e:
+                print(f"{self.table} replay failed: {str(e)}")  # For server-side logging
+                self._spill(rows[i:])
+                return
+
+@st.cache_resource
+def get_span_writer():
+    """Process-wide writer for the trace_spans table"""
+    conn = st.connection("supabase", type=SupabaseConnection)
+    return UsageWriter(conn, batch_size=50, spill_path=SPANS_SPILL_PATH, table="trace_spans")
+
+@st.cache_resource
+def get_usage_writer():
+    """Process-wide usage writer shared by all sessions"""
+    conn = st.connection("supabase", type=SupabaseConnection)
+    return UsageWriter(conn, span_writer=get_span_writer())
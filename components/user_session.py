@@ -0,0 +1,79 @@
+import streamlit as st
+from st_supabase_connection import SupabaseConnection
+from dataclasses import dataclass
+from typing import Optional
+from .get_prompt import remember_user_prompt
+
+SESSION_KEY = "user_session"
+
+# Prompt given to a new user on first login
+DEFAULT_USER_PROMPT = """Given medical notes or transcription, produce a concise summary in standard medical format:
+- No duplication of information between sections.
+- All lab results must only appear in the "Labs" section.
+- All future actions/items must be included in the "Action Plan" section.
+
+**Sections:**
+- **CC**: Reason for visit/consultation
+- **HPI**: Patient complaints, history, context
+- **Treatments Tried**: List
+- **Physical Exam**: List
+- **Labs**: All laboratory results
+- **Imaging**: List
+- **Diagnosis/Impression**: List
+- **Action Plan**: List"""
+
+@dataclass
+class UserSession:
+    """Profile of the logged in user, loaded once per session
+    The prompt is not kept here but in the process-wide prompt cache, so
+    that saving it reaches every session: read it with get_user_prompt_text.
+    """
+    email: str
+    credit: Optional[int]
+
+def get_user_session() -> Optional[UserSession]:
+    """The current user's session object, or None if it was not bootstrapped yet"""
+    user_email = st.experimental_user.email if st.experimental_user else None
+    session = st.session_state.get(SESSION_KEY)
+    if session is None or session.email != user_email:
+        return None
+    return session
+
+def update_user_session(user_email, **changes):
+    """Apply changes made to a user's row to the session object, if it is theirs"""
+    session = st.session_state.get(SESSION_KEY)
+    if session is not None and session.email == user_email:
+        for field, value in changes.items():
+            setattr(session, field, value)
+
+def bootstrap_user_session() -> Optional[UserSession]:
+    """
+    Create the user's profile if needed and load prompt and credit, once per session
+    One call to the bootstrap_user database function replaces the separate
+    select, insert and credit queries every page used to make.
+    Returns:
+        UserSession or None: None when not logged in or on error
+    """
+    user_email = st.experimental_user.email if st.experimental_user else None
+    if not user_email:
+        return None
+
+    session = get_user_session()
+    if session is not None:
+        return session
+
+    try:
+        conn = st.connection("supabase", type=SupabaseConnection)
+        result = conn.client.rpc(
+            "bootstrap_user", {"p_email": user_email, "p_default_prompt": DEFAULT_USER_PROMPT}
+        ).execute()
+        row = result.data[0]
+        remember_user_prompt(user_email, row["prompt"] or DEFAULT_USER_PROMPT)
+        session = UserSession(email=user_email, credit=row["credit"])
+        st.session_state[SESSION_KEY] = session
+        return session
+    except Exception as e:
+        # Not stored, so the next rerun tries again
+        st.error(f"Error initializing user profile: {str(e)}")
+        print(f"Error in bootstrap_user_session: {str(e)}")  # For server-side logging
+        return None
@@ -0,0 +1,121 @@
+import bisect
+from dataclasses import dataclass, field
+from typing import List, Tuple
+import numpy as np
+from pydub import AudioSegment
+from .audio import TARGET_RATE, iter_samples
+
+# Voice activity, conservative by design since cut audio is never
+# transcribed: a 30 ms frame is quiet only when its level is within
+# NOISE_MARGIN_DB of the recording's noise floor, anything louder is kept.
+# The floor is a low percentile of all frame levels, so a sound at the very
+# start of the recording does not set it. Quiet runs longer than MIN_GAP_MS
+# (exams, typing, the doctor stepping out) are cut, keeping a HANGOVER_MS
+# tail after speech and a LEAD_IN_MS before it so words are never clipped;
+# shorter pauses stay, they separate turns.
+FRAME_MS = 30
+MIN_GAP_MS = 2000
+HANGOVER_MS = 500
+LEAD_IN_MS = 250
+NOISE_PERCENTILE = 10
+NOISE_MARGIN_DB = 3
+NOISE_FLOOR_MIN_DB = -80  # dBFS, so near-digital silence does not make room noise count as speech
+
+@dataclass
+class TimeMap:
+    """Positions in trimmed audio back to the original recording
+
+    cuts holds one (trimmed_ms, removed_ms) entry per cut: from trimmed_ms
+    on, the original recording is removed_ms ahead in total.
+    """
+    cuts: List[Tuple[int, int]] = field(default_factory=list)
+
+    @property
+    def removed_ms(self):
+        return self.cuts[-1][1] if self.cuts else 0
+
+    def to_original(self, trimmed_ms):
+        """Original time of a position in the trimmed audio, e.g. a word timestamp"""
+        index = bisect.bisect_right(self.cuts, (trimmed_ms, float("inf"))) - 1
+        return trimmed_ms + (self.cuts[index][1] if index >= 0 else 0)
+
+def _frames(source, frame_samples):
+    """Fixed-size frames out of the decoder's variable-size chunks, the last one possibly shorter"""
+    pending = np.zeros(0, dtype=np.int16)
+    for samples in iter_samples(source):
+        pending = np.concatenate([pending, samples])
+        count = len(pending) // frame_samples
+        for index in range(count):
+            yield pending[index * frame_samples:(index + 1) * frame_samples]
+        pending = pending[count * frame_samples:]
+    if len(pending):
+        yield pending
+
+def _level_db(frame):
+    rms = np.sqrt(np.mean(frame.astype(np.float64) ** 2))
+    return 20 * np.log10(rms / 32768 + 1e-10)
+
+def trim_silence(source):
+    """Decode a recording as a stream and drop its long quiet spans
+    The recording is decoded twice, once to measure the noise floor and
+    once to cut. Only the kept 16 kHz mono audio is held in memory, so a
+    200 MB WAV is never loaded whole.
+    Args:
+        source: path or seekable file-like object in any format av can decode
+    Returns:
+        tuple: (AudioSegment of the kept audio, TimeMap back to the recording)
+    """
+    frame_samples = TARGET_RATE * FRAME_MS // 1000
+    gap_frames = MIN_GAP_MS // FRAME_MS
+    hangover_frames = HANGOVER_MS // FRAME_MS
+    lead_in_frames = LEAD_IN_MS // FRAME_MS
+    to_ms = lambda samples: samples * 1000 // TARGET_RATE
+
+    levels = np.array([_level_db(frame) for frame in _frames(source, frame_samples)])
+    if not len(levels):
+        return AudioSegment.empty().set_frame_rate(TARGET_RATE), TimeMap()
+    quiet_db = max(np.percentile(levels, NOISE_PERCENTILE), NOISE_FLOOR_MIN_DB) + NOISE_MARGIN_DB
+
+    kept = []
+    kept_samples = 0
+    dropped_samples = 0
+    time_map = TimeMap()
+    # Current quiet run: held whole until it is long enough to cut, then
+    # only its last lead_in_frames are kept for when speech resumes
+    run = []
+    cutting = False
+
+    def keep(frames):
+        nonlocal kept_samples
+        for frame in frames:
+            kept.append(frame.tobytes())
+            kept_samples += len(frame)
+
+    for frame, level in zip(_frames(source, frame_samples), levels):
+        if level > quiet_db:
+            if cutting:
+                # Counted in samples so rounding never accumulates over cuts
+                time_map.cuts.append((to_ms(kept_samples), to_ms(dropped_samples)))
+            keep(run)
+            keep([frame])
+            run = []
+            cutting = False
+        elif cutting:
+            dropped_samples += len(run[0])
+            run = run[1:] + [frame]
+        else:
+            run.append(frame)
+            if len(run) >= gap_frames:
+                keep(run[:hangover_frames])
+                dropped_samples += sum(len(f) for f in run[hangover_frames:-lead_in_frames])
+                run = run[-lead_in_frames:]
+                cutting = True
+
+    if cutting:
+        # Trailing quiet: nothing more to keep
+        dropped_samples += sum(len(f) for f in run)
+        time_map.cuts.append((to_ms(kept_samples), to_ms(dropped_samples)))
+    else:
+        keep(run)
+    audio = AudioSegment(data=b"".join(kept), sample_width=2, frame_rate=TARGET_RATE, channels=1)
+    return audio, time_map
@@ -1,5 +1,10 @@
 import streamlit as st
 from datetime import datetime
+import queue
+from streamlit_webrtc import webrtc_streamer, WebRtcMode
+from components.audio import FORMATS, load_audio, encode_audio
+from components.live_transcription import LIVE_SESSION_CREDITS, start_live_session, FrameConverter
+from components.user_session import bootstrap_user_session
 
 def get_file_size_mb(audio_bytes):
     """Calculate file size in MB"""
@@ -11,17 +16,89 @@ st.header("Audio Recorder", divider="grey")
 st.markdown("##### Enter patient details below:")
 patient_name = st.text_input("👤 Patient Name", help="Data saved only your PC ONLY")
 
+record_tab, live_tab = st.tabs(["Record", "Live transcription"])
+
 # Recording section
-audio_bytes = st.audio_input("Click to record audio")
-
-if audio_bytes and patient_name:
-    file_name = f"{patient_name}__{datetime.now().strftime('%Y%m%d_%H%M%S')}.wav"
-    st.download_button(
-        "💾 Save Recording",
-        data=audio_bytes,
-        file_name=file_name,
-        mime="audio/wav",
-        use_container_width=True
+with record_tab:
+    audio_bytes = st.audio_input("Click to record audio")
+    save_format = st.radio(
+        "File format",
+        options=["opus", "flac", "wav"],
+        format_func={"opus": "Opus (smallest)", "flac": "FLAC (lossless)", "wav": "WAV (raw)"}.get,
+        horizontal=True,
+        help="Opus and FLAC recordings are 16 kHz mono and upload much faster"
     )
-elif audio_bytes and not patient_name:
-    st.warning("Please enter patient name before saving")
+
+    if audio_bytes and patient_name:
+        if save_format == "wav":
+            data, extension, mime = audio_bytes, "wav", "audio/wav"
+        else:
+            _, _, extension, mime = FORMATS[save_format]
+            data = encode_audio(load_audio(audio_bytes), save_format)
+        file_name = f"{patient_name}__{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extension}"
+        st.caption(f"File size: {get_file_size_mb(data.getvalue()):.1f} MB")
+        st.download_button(
+            "💾 Save Recording",
+            data=data,
+            file_name=file_name,
+            mime=mime,
+            use_container_width=True
+        )
+    elif audio_bytes and not patient_name:
+        st.warning("Please enter patient name before saving")
+
+# Live transcription section: microphone frames are streamed while the consult happens.
+# The realtime session is paid for with the app's key, so it needs a login and a credit.
+with live_tab:
+    if not st.experimental_user.is_logged_in:
+        st.warning("⚠️ Please log in to use live transcription. Return to the main page to sign in.")
+        st.page_link("Scribe.py", label="🏠 Return to Homepage", use_container_width=True)
+    else:
+        user_session = bootstrap_user_session()
+        st.caption(f"The transcript builds up while you speak, and can be summarized as soon as you stop. "
+                   f"Each live session uses {LIVE_SESSION_CREDITS} credit.")
+        webrtc_ctx = webrtc_streamer(
+            key="live-transcription",
+            mode=WebRtcMode.SENDONLY,
+            audio_receiver_size=1024,
+            media_stream_constraints={"audio": True, "video": False},
+        )
+        transcript_placeholder = st.empty()
+
+        if webrtc_ctx.state.playing and webrtc_ctx.audio_receiver and user_session is not None:
+            if "live_backend" not in st.session_state:
+                backend = start_live_session(user_session.email)
+                if backend is not None:
+                    st.session_state.live_backend = backend
+                    st.session_state.live_transcript = ""
+            backend = st.session_state.get("live_backend")
+            converter = FrameConverter()
+
+            # Runs until the recording is stopped, which reruns the script
+            while backend is not None:
+                try:
+                    frames = webrtc_ctx.audio_receiver.get_frames(timeout=1)
+                except queue.Empty:
+                    if not webrtc_ctx.state.playing:
+                        break
+                    continue
+                backend.send_audio(converter.convert(frames))
+                transcript_placeholder.markdown(backend.text)
+
+        elif "live_backend" in st.session_state:
+            # Recording stopped: close the session and keep the final transcript
+            with st.spinner("Finishing transcription..."):
+                st.session_state.live_transcript = st.session_state.live_backend.stop()
+            del st.session_state.live_backend
+
+        if st.session_state.get("live_transcript") and not webrtc_ctx.state.playing:
+            transcript_placeholder.markdown(st.session_state.live_transcript)
+            if st.button("🎯 Summarize", use_container_width=True):
+                from components.generate_summary import stream_summarize
+                st.subheader("Summary")
+                st.write_stream(stream_summarize(
+                    input_text=st.session_state.live_transcript,
+                    model="claude-3-5-sonnet-latest",
+                    tag="audio_summary_live",
+                    compact=True
+                ))
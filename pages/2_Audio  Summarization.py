@@ -1,117 +1,217 @@
 import streamlit as st
-import assemblyai as aai
-from components.generate_summary import generate_summary_claude
+from st_supabase_connection import SupabaseConnection
+from components.audio import INPUT_TYPES
+from components.jobs import submit_job, recent_jobs, watch_jobs, is_finished
+from components.summary_jobs import audio_summary_job
+from components.get_prompt import get_user_prompt_text
+from components.user_session import bootstrap_user_session, update_user_session
 from st_copy_to_clipboard import st_copy_to_clipboard
+from datetime import datetime
+import uuid
 import re
 
+FILENAME_PATTERN = r"(.+)__(\d{8})_(\d{6})\.\w+$"
+RECOVERY_MAX_AGE = 3600  # Seconds results are picked up again after a reload
+
+def parse_recording_name(filename):
+    """Extract patient name, date and time from a recorder file name
+    Returns:
+        tuple: (patient_name, date_str, time_str, matched)
+    """
+    match = re.match(FILENAME_PATTERN, filename)
+    if not match:
+        # Handle unknown format
+        current_time = datetime.now()
+        return "Unknown", current_time.strftime("%Y-%m-%d"), current_time.strftime("%H:%M:%S"), False
+    # Format date and time from filename
+    date_str = f"{match.group(2)[:4]}-{match.group(2)[4:6]}-{match.group(2)[6:]}"
+    time_str = f"{match.group(3)[:2]}:{match.group(3)[2:4]}:{match.group(3)[4:]}"
+    return match.group(1), date_str, time_str, True
+
+@st.cache_resource
+def assemblyai():
+    """AssemblyAI SDK, imported and given the API key on the first transcription of the process"""
+    import assemblyai as aai
+    aai.settings.api_key = st.secrets["ASSEMBLYAI"]
+    return aai
+
+def transcription_config():
+    # Configure transcription similar to paid version
+    aai = assemblyai()
+    return aai.TranscriptionConfig(
+        speech_model=aai.SpeechModel.best,
+        language_detection=True
+    )
+
+def submit_recording(uploaded_file, tag, user_session, batch_id=None):
+    """Transcribe and summarize an uploaded file in a background job, which outlives the session's reruns
+    The job gets the uploaded file itself, not a copy of its bytes, and
+    only reads it once it starts running.
+    Returns:
+        str: job id
+    """
+    return submit_job(
+        user_session.email, tag, audio_summary_job,
+        uploaded_file, transcription_config(), tag, user_session.email,
+        get_user_prompt_text(st.connection("supabase", type=SupabaseConnection)),
+        title=uploaded_file.name, batch_id=batch_id
+    )
+
+def trimming_caption(minutes_saved):
+    """Minutes of silence dropped before upload, shown under a summary"""
+    return f"Silence trimming skipped {minutes_saved:.1f} min of audio before upload"
+
+def show_recording(jobs):
+    """Progress of a single-file job, then its summary and transcript"""
+    job = jobs[0]
+    if job is None:
+        return
+    if job["status"] in ("queued", "running"):
+        st.progress(job["progress"], text=job["message"])
+        if job["partial"]:
+            # Summary so far, streamed as it is generated
+            st.subheader("Summary")
+            st.markdown(job["partial"])
+    elif job["status"] == "done":
+        result = job["result"]
+        # Check detected language
+        if result["language"] not in ["en", "fr"]:
+            st.warning(f"Detected language is {result['language']}. This tool is optimized for English and French.")
+
+        # Display Summary first
+        st.subheader("Summary")
+        st.markdown(result["summary"])
+        st.success("Processing complete!")
+        st.caption(trimming_caption(result["minutes_saved"]))
+        st_copy_to_clipboard(result["summary"])  # Add copy button for summary
+
+        # Display Transcript below
+        st.subheader("Transcript")
+        st.write(result["transcript"])
+    else:
+        st.error(f"An error occurred: {job['error']}")
+
+def batch_result(job):
+    """Patient details of a batch job's file, with its result or error"""
+    patient_name, date_str, time_str, _ = parse_recording_name(job["title"])
+    result = {"file_name": job["title"], "patient": patient_name, "date": date_str, "time": time_str}
+    if job["status"] == "done":
+        result.update(job["result"])
+    elif is_finished(job):
+        result["error"] = job["error"]
+    return result
+
+def show_batch(jobs):
+    """One progress bar per file still running, then the results and their export"""
+    jobs = [job for job in jobs if job is not None]
+    results = [batch_result(job) for job in jobs]
+    for job, result in zip(jobs, results):
+        if not is_finished(job):
+            with st.container(border=True):
+                st.markdown(f"**{result['patient']}** · {result['date']} {result['time']}")
+                st.progress(job["progress"], text=job["message"])
+
+    finished = [result for result in results if "summary" in result or "error" in result]
+    if finished:
+        st.subheader("Results")
+    for result in finished:
+        with st.expander(f"{result['patient']} · {result['date']} {result['time']}"):
+            if "error" in result:
+                st.error(f"An error occurred: {result['error']}")
+                continue
+            st.markdown(result["summary"])
+            st_copy_to_clipboard(result["summary"], key=f"copy_{result['file_name']}")
+            st.caption(trimming_caption(result["minutes_saved"]))
+            st.caption("Transcript")
+            st.write(result["transcript"])
+    if finished and len(finished) == len(results):
+        st.download_button(
+            "💾 Export all summaries",
+            data=combined_export(results),
+            file_name=f"summaries_{datetime.now().strftime('%Y%m%d_%H%M%S')}.md",
+            mime="text/markdown",
+            use_container_width=True
+        )
+
+def combined_export(results):
+    """All summaries of a batch as one markdown document"""
+    sections = []
+    for result in results:
+        body = result.get("summary") or f"Error: {result.get('error')}"
+        sections.append(f"## {result['patient']} · {result['date']} {result['time']}\n\n{body}")
+    return "\n\n---\n\n".join(sections)
+
 if not st.experimental_user.is_logged_in:
     st.warning("⚠️ Please log in to access the Audio Summarizer. Return to the main page to sign in.")
     st.page_link("Scribe.py", label="🏠 Return to Homepage", use_container_width=True)
 else:
-    # Initialize AssemblyAI
-    aai.settings.api_key = st.secrets["ASSEMBLYAI"]
+    # Prompt and credits for the summaries, loaded once per session
+    user_session = bootstrap_user_session()
 
     st.header("Audio Summarizer", divider="grey")
     st.markdown("##### Upload a recorded audio file for transcription and summary")
 
-    # File uploader with size validation (max 100MB)
-    MAX_FILE_SIZE = 200 * 1024 * 1024  # 100MB
-    uploaded_file = st.file_uploader("Choose an audio file", type=['wav'])
-
-    if uploaded_file:
-        # Validate file size
-        if uploaded_file.size > MAX_FILE_SIZE:
-            st.error(f"File size exceeds maximum limit of {MAX_FILE_SIZE/1024/1024}MB")
-        else:
-            # Extract patient name and datetime from filename
-            filename_pattern = r"(.+)__(\d{8})_(\d{6})\.wav"
-            match = re.match(filename_pattern, uploaded_file.name)
-            
-            if not match:
-                # Handle unknown format
-                from datetime import datetime
-                current_time = datetime.now()
-                patient_name = "Unknown"
-                date_str = current_time.strftime("%Y-%m-%d")
-                time_str = current_time.strftime("%H:%M:%S")
-                st.warning(f"Unrecognized filename format. Using default values.")
+    # File uploader with size validation (max 200MB)
+    MAX_FILE_SIZE = 200 * 1024 * 1024  # 200MB
+    single_tab, batch_tab = st.tabs(["Single file", "Batch"])
+
+    # Transcription and summary run as background jobs: a rerun, a reload or
+    # a dropped connection does not lose the work the credits were spent on.
+    # After a reload the session is new, so the user's last jobs are picked up.
+    if user_session is not None and "audio_job" not in st.session_state:
+        last_jobs = recent_jobs(user_session.email, "audio_summary_manual", max_age=RECOVERY_MAX_AGE)
+        st.session_state.audio_job = last_jobs[0]["id"] if last_jobs else None
+    if user_session is not None and "batch_jobs" not in st.session_state:
+        last_jobs = recent_jobs(user_session.email, "audio_summary_batch", max_age=RECOVERY_MAX_AGE)
+        latest_batch = last_jobs[0]["batch_id"] if last_jobs else None
+        # Oldest first, as the files were uploaded
+        st.session_state.batch_jobs = [job["id"] for job in reversed(last_jobs) if job["batch_id"] == latest_batch]
+
+    # The jobs spent credits outside the session, whose balance is reloaded when they end
+    reload_credits = lambda: update_user_session(user_session.email, credit=None)
+
+    with single_tab:
+        uploaded_file = st.file_uploader("Choose an audio file", type=INPUT_TYPES)
+
+        if uploaded_file:
+            # Validate file size
+            if uploaded_file.size > MAX_FILE_SIZE:
+                st.error(f"File size exceeds maximum limit of {MAX_FILE_SIZE/1024/1024}MB")
             else:
-                patient_name = match.group(1)
-                # Format date and time from filename
-                date_str = f"{match.group(2)[:4]}-{match.group(2)[4:6]}-{match.group(2)[6:]}"
-                time_str = f"{match.group(3)[:2]}:{match.group(3)[2:4]}:{match.group(3)[4:]}"
+                # Extract patient name and datetime from filename
+                patient_name, date_str, time_str, matched = parse_recording_name(uploaded_file.name)
+                if not matched:
+                    st.warning(f"Unrecognized filename format. Using default values.")
             
-            # Display patient info with date and time
-            st.info(f"""
-            Patient: {patient_name}
-            Date: {date_str}
-            Time: {time_str}
-            """)
+                # Display patient info with date and time
+                st.info(f"""
+                Patient: {patient_name}
+                Date: {date_str}
+                Time: {time_str}
+                """)
                 
-            if st.button("🎯 Transcribe and Summarize", use_container_width=True):
-                try:
-                    progress_bar = st.progress(0)
-                    with st.spinner("Transcribing audio..."):
-                        # Create temp file for processing
-                        with open("temp_audio.wav", "wb") as f:
-                            f.write(uploaded_file.getbuffer())
-                        
-                        progress_bar.progress(30)
-                        
-                        try:
-                            # Configure transcription similar to paid version
-                            config = aai.TranscriptionConfig(
-                                speech_model=aai.SpeechModel.best,
-                                language_detection=True
-                            )
-                            
-                            transcriber = aai.Transcriber(config=config)
-                            transcript = transcriber.transcribe("temp_audio.wav")
-                            
-                            # Check for transcription errors
-                            if transcript.status == aai.TranscriptStatus.error:
-                                raise ValueError(f"Transcription error: {transcript.error}")
-                                
-                            # Get transcript text directly from the transcript object
-                            transcript_text = transcript.text
-                            detected_language = getattr(transcript, 'language_code', 'unknown')
-                            
-                            if not transcript_text:
-                                raise ValueError("No transcription text received from AssemblyAI")
-                                
-                            progress_bar.progress(60)
-                            
-                            # Check detected language
-                            if detected_language not in ["en", "fr"]:
-                                st.warning(f"Detected language is {detected_language}. This tool is optimized for English and French.")
-                            
-                            # Generate summary with text only
-                            summary, input_tokens, output_tokens = generate_summary_claude(
-                                input_text=transcript_text,
-                                model="claude-3-5-sonnet-latest",
-                                tag="audio_summary_manual"
-                            )
-                            
-                            progress_bar.progress(100)
-                            
-                            # Display results
-                            st.success("Processing complete!")
-                            
-                            # Display Summary first
-                            st.subheader("Summary")
-                            st.write(summary)
-                            st_copy_to_clipboard(summary)  # Add copy button for summary
-                            
-                            # Display Transcript below
-                            st.subheader("Transcript")
-                            st.write(transcript_text)
-                            
-                        finally:
-                            # Cleanup temp file
-                            import os
-                            if os.path.exists("temp_audio.wav"):
-                                os.remove("temp_audio.wav")
-                                
-                except Exception as e:
-                    st.error(f"An error occurred: {str(e)}")
-                    progress_bar.empty()
+                if st.button("🎯 Transcribe and Summarize", use_container_width=True, disabled=user_session is None):
+                    st.session_state.audio_job = submit_recording(uploaded_file, "audio_summary_manual", user_session)
+
+        if st.session_state.get("audio_job"):
+            watch_jobs([st.session_state.audio_job], show_recording, on_finished=reload_credits)
+
+    with batch_tab:
+        uploaded_files = st.file_uploader(
+            "Choose audio files", type=INPUT_TYPES, accept_multiple_files=True, key="batch_files"
+        )
+
+        if uploaded_files:
+            too_large = [f.name for f in uploaded_files if f.size > MAX_FILE_SIZE]
+            if too_large:
+                st.error(f"Files over the {MAX_FILE_SIZE/1024/1024}MB limit: {', '.join(too_large)}")
+            elif st.button(f"🎯 Transcribe and Summarize {len(uploaded_files)} files", use_container_width=True,
+                           disabled=user_session is None):
+                batch_id = uuid.uuid4().hex
+                st.session_state.batch_jobs = [
+                    submit_recording(uploaded_file, "audio_summary_batch", user_session, batch_id)
+                    for uploaded_file in uploaded_files
+                ]
+
+        if st.session_state.get("batch_jobs"):
+            watch_jobs(st.session_state.batch_jobs, show_batch, on_finished=reload_credits)
@@ -1,9 +1,13 @@
 import streamlit as st
 from st_supabase_connection import SupabaseConnection
-from components.generate_summary import generate_summary, generate_summary_claude
+from components.jobs import submit_job, recent_jobs, watch_jobs
+from components.summary_jobs import notes_summary_job
+from components.get_prompt import get_user_prompt_text
+from components.user_session import bootstrap_user_session, update_user_session
 import datetime
 from st_copy_to_clipboard import st_copy_to_clipboard
-import time
+
+RECOVERY_MAX_AGE = 3600  # Seconds a summary is picked up again after a reload
 
 if not st.experimental_user.is_logged_in:
     st.warning("⚠️ Please log in to access Notes Summarization. Return to the main page to sign in.")
@@ -12,6 +16,9 @@ else:
     # Create a supabase client
     conn = st.connection("supabase",type=SupabaseConnection)
 
+    # Prompt and credits for the summaries, loaded once per session
+    user_session = bootstrap_user_session()
+
     MODELS = {
     "claude-3-5-sonnet-latest": "claude-3-5-sonnet-latest",
     "gpt-4o-mini": "gpt-4o-mini",
@@ -28,29 +35,37 @@ else:
     # 1. Collect inputs
     input_text = st.text_area("Input Text", help="Put your rough notes here", height=350)
 
-    # 2. Initialize session_state variables (only once)
-    if "ai_output_text" not in st.session_state:
-        st.session_state.ai_output_text = ""
-
-
-    # 3. Button to create summary (only updates session_state)
-    if st.button("Create Summary"):
-        st.session_state["start_time"] = time.time()
-        if model in ["chatgpt-4o-latest", "gpt-4o-mini", "o1-mini"]:
-            ai_output_text, input_tokens, output_tokens = generate_summary(input_text, model, "Handwritten")    
-        elif model in ["claude-3-5-sonnet-latest","claude-3-5-haiku-latest"]:
-            ai_output_text, input_tokens, output_tokens = generate_summary_claude(input_text,model,"Handwritten")
-
+    # 2. Button to create summary: it runs as a background job, so a rerun
+    # or a reload does not lose the summary the credit was spent on
+    if st.button("Create Summary", disabled=user_session is None):
+        st.session_state.notes_job = submit_job(
+            user_session.email, "notes_summary", notes_summary_job,
+            input_text, model, user_session.email, get_user_prompt_text(conn), lane="short"
+        )
 
-        # Store the results in session_state
-        st.session_state.ai_output_text = ai_output_text
-        st.session_state.input_tokens = input_tokens
-        st.session_state.output_tokens = output_tokens
-        
+    # After a reload the session is new: pick up the user's last summary
+    if "notes_job" not in st.session_state and user_session is not None:
+        last_jobs = recent_jobs(user_session.email, "notes_summary", max_age=RECOVERY_MAX_AGE)
+        st.session_state.notes_job = last_jobs[0]["id"] if last_jobs else None
 
-    # 4. Show the summary output and cost (if we have any)
-    if st.session_state.ai_output_text:
-        st.markdown("### AI-Generated Summary")
-        st.markdown(st.session_state.ai_output_text)
-        st_copy_to_clipboard(st.session_state.ai_output_text)
+    # 3. Show the summary as it streams in, then the final output
+    def show_summary(jobs):
+        job = jobs[0]
+        if job is None:
+            return
+        if job["status"] in ("queued", "running"):
+            st.progress(job["progress"], text=job["message"])
+        if job["status"] == "done":
+            st.markdown("### AI-Generated Summary")
+            st.markdown(job["result"]["summary"])
+            st_copy_to_clipboard(job["result"]["summary"])
+        elif job["partial"]:
+            st.markdown("### AI-Generated Summary")
+            st.markdown(job["partial"])
+        if job["status"] in ("failed", "interrupted"):
+            st.error(f"An error occurred: {job['error']}")
 
+    if st.session_state.get("notes_job"):
+        # The job spent credits outside the session, whose balance is reloaded when it ends
+        watch_jobs([st.session_state.notes_job], show_summary,
+                   on_finished=lambda: update_user_session(user_session.email, credit=None))
@@ -2,6 +2,8 @@ import streamlit as st
 from st_supabase_connection import SupabaseConnection
 from components.available_credits import display_credits
 from components.purchase_credits import purchase_credits_section
+from components.get_prompt import get_user_prompt_text, invalidate_user_prompt
+from components.user_session import bootstrap_user_session
 
 if not st.experimental_user.is_logged_in:
     st.warning("⚠️ Please log in to access Settings. Return to the main page to sign in.")
@@ -17,11 +19,8 @@ else:
     user_data = st.experimental_user
     user_email = st.experimental_user.email if st.experimental_user else None
 
-    def get_user_prompt():
-        if user_email:
-            response = conn.table("prompts").select("*").eq("email", user_email).execute()
-            return response.data[0] if response.data else None
-        return None
+    # Profile created and prompt cached once per session
+    user_session = bootstrap_user_session()
 
     # Display AI Credits using the new component
     if user_email:
@@ -39,11 +38,12 @@ else:
         }
         
         try:
-            existing_prompt = get_user_prompt()
-            if existing_prompt:
-                conn.table("prompts").update(data).eq("email", user_email).execute()
-            else:
+            # The row is created at bootstrap, insert only if it is missing anyway
+            response = conn.table("prompts").update(data).eq("email", user_email).execute()
+            if not response.data:
                 conn.table("prompts").insert(data).execute()
+            # Every session of the user reads the new prompt from here on
+            invalidate_user_prompt(user_email)
             return True
         except Exception as e:
             st.error(f"Database error: {str(e)}")
@@ -55,11 +55,9 @@ else:
         
         with tab1:
             try:
-                existing_prompt = get_user_prompt()
-                
                 new_prompt = st.text_area(
                     "Your custom prompt",
-                    value=existing_prompt["prompt"] if existing_prompt else "",
+                    value=get_user_prompt_text(conn) if user_session else "",
                     help="You can only save one custom prompt. Saving a new one will replace the existing one.",
                     height=350
                 )
@@ -0,0 +1,60 @@
+import streamlit as st
+from st_supabase_connection import SupabaseConnection
+from datetime import datetime, timedelta, timezone
+import pandas as pd
+
+WINDOWS = {"Last 24 hours": timedelta(days=1), "Last 7 days": timedelta(days=7), "Last 30 days": timedelta(days=30)}
+
+# Stages in request order, for display
+STAGE_ORDER = ["decode", "upload", "transcription", "compaction", "prompt_fetch", "credit_deduction",
+               "llm_map", "llm_first_token", "llm", "total", "aiusage_insert"]
+
+@st.cache_data(ttl=60)
+def load_percentiles(since_iso):
+    """p50/p95/p99 rows from the latency_percentiles database function, refreshed every minute"""
+    conn = st.connection("supabase", type=SupabaseConnection)
+    return conn.client.rpc("latency_percentiles", {"p_since": since_iso}).execute().data or []
+
+def percentile_table(rows, index):
+    """Rows as a table in seconds, one line per index value"""
+    df = pd.DataFrame(rows)
+    df[index] = df[index].fillna("all")
+    for column in ["p50", "p95", "p99"]:
+        df[column] = (df[column] / 1000).round(2)
+    return df[index + ["samples", "p50", "p95", "p99"]].rename(
+        columns={"p50": "p50 (s)", "p95": "p95 (s)", "p99": "p99 (s)"}
+    )
+
+if not st.experimental_user.is_logged_in:
+    st.warning("⚠️ Please log in to access Performance. Return to the main page to sign in.")
+    st.page_link("Scribe.py", label="🏠 Return to Homepage", use_container_width=True)
+else:
+    st.header("Performance", divider="grey")
+    window = st.selectbox("Period", options=list(WINDOWS.keys()))
+    # Rounded to the minute so the cached query is reused across reruns
+    since = (datetime.now(timezone.utc) - WINDOWS[window]).replace(second=0, microsecond=0)
+
+    try:
+        rows = load_percentiles(since.isoformat())
+    except Exception as e:
+        st.error(f"Error fetching latency data: {str(e)}")
+        rows = []
+
+    if not rows:
+        st.info("No timing data for this period yet")
+    else:
+        st.subheader("LLM calls per model")
+        for metric, label in [("ttft", "Time to first token"), ("latency", "Total latency")]:
+            metric_rows = [row for row in rows if row["metric"] == metric]
+            if metric_rows:
+                st.markdown(f"##### {label}")
+                st.dataframe(percentile_table(metric_rows, ["model"]), hide_index=True, use_container_width=True)
+
+        stage_rows = [row for row in rows if row["metric"] == "stage"]
+        if stage_rows:
+            st.subheader("Stages")
+            table = percentile_table(stage_rows, ["stage", "model"])
+            table["order"] = table["stage"].map({stage: i for i, stage in enumerate(STAGE_ORDER)})
+            table = table.sort_values(["order", "model"]).drop(columns="order")
+            st.dataframe(table, hide_index=True, use_container_width=True)
+            st.caption("Upload and transcription are timed per audio segment, total from the start of a request to the end of its summary.")
@@ -0,0 +1,32 @@
+-- Atomic credit operations on the prompts table.
+-- Each function runs as a single statement, so concurrent requests can
+-- never overdraw or lose an update, and returns the new balance.
+
+-- Debit p_amount credits if the balance allows it.
+-- Returns the new balance, or NULL when the user has no row or too few credits.
+create or replace function public.deduct_credits(p_email text, p_amount integer default 1)
+returns integer
+language sql
+security definer
+set search_path = public
+as $$
+    update prompts
+       set credit = credit - p_amount
+     where email = p_email
+       and credit >= p_amount
+    returning credit;
+$$;
+
+-- Credit p_amount back to the user (purchases and refunds).
+-- Returns the new balance, or NULL when the user has no row.
+create or replace function public.add_credits(p_email text, p_amount integer)
+returns integer
+language sql
+security definer
+set search_path = public
+as $$
+    update prompts
+       set credit = coalesce(credit, 0) + p_amount
+     where email = p_email
+    returning credit;
+$$;
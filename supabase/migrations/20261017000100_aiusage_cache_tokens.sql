@@ -0,0 +1,6 @@
+-- Prompt-cache token counts reported by the providers.
+-- cached_input_tokens: prefix tokens read from the provider cache (OpenAI cached_tokens, Anthropic cache_read_input_tokens)
+-- cache_creation_input_tokens: tokens written to the Anthropic cache on a miss
+alter table public.aiusage
+    add column if not exists cached_input_tokens integer not null default 0,
+    add column if not exists cache_creation_input_tokens integer not null default 0;
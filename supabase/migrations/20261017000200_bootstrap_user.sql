@@ -0,0 +1,24 @@
+-- Session bootstrap: one round trip on login instead of a select, an
+-- optional insert and a separate credit query.
+
+-- Create the user's row with the default prompt if it does not exist yet,
+-- then return the stored prompt and credit balance.
+create or replace function public.bootstrap_user(p_email text, p_default_prompt text)
+returns table (prompt text, credit integer)
+language plpgsql
+security definer
+set search_path = public
+as $$
+#variable_conflict use_column
+begin
+    insert into prompts (email, prompt)
+    select p_email, p_default_prompt
+     where not exists (select 1 from prompts existing where existing.email = p_email);
+
+    return query
+        select p.prompt, p.credit
+          from prompts p
+         where p.email = p_email
+         limit 1;
+end;
+$$;
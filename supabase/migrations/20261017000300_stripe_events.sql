@@ -0,0 +1,49 @@
+-- Idempotent credit grants for Stripe webhooks.
+-- Stripe delivers events at least once, so every processed event id is
+-- recorded and a redelivery never grants credits twice.
+
+create table if not exists public.stripe_events (
+    event_id text primary key,
+    event_type text not null,
+    email text,
+    credits integer not null default 0,
+    processed_at timestamptz not null default now()
+);
+
+alter table public.stripe_events enable row level security;
+
+-- Record the event and add p_amount credits to p_email in one transaction.
+-- Returns the new balance, or NULL when the event was already processed.
+-- Raises when the user has no row, so the event is not recorded and
+-- Stripe retries it later.
+create or replace function public.apply_stripe_event(
+    p_event_id text, p_event_type text, p_email text, p_amount integer
+)
+returns integer
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+    new_credit integer;
+begin
+    insert into stripe_events (event_id, event_type, email, credits)
+    values (p_event_id, p_event_type, p_email, p_amount)
+    on conflict (event_id) do nothing;
+
+    if not found then
+        return null;
+    end if;
+
+    update prompts
+       set credit = coalesce(credit, 0) + p_amount
+     where email = p_email
+    returning credit into new_credit;
+
+    if new_credit is null then
+        raise exception 'No user row for %', p_email;
+    end if;
+
+    return new_credit;
+end;
+$$;
@@ -0,0 +1,64 @@
+-- Latency instrumentation.
+-- aiusage rows get the timing of their LLM call, and trace_spans holds one
+-- row per timed stage of a request (decode, upload, transcription,
+-- prompt_fetch, credit_deduction, llm_map, llm_first_token, llm, total,
+-- aiusage_insert), linked to aiusage by trace_id.
+
+alter table public.aiusage
+    add column if not exists created_at timestamptz not null default now(),
+    add column if not exists ttft_ms integer,
+    add column if not exists latency_ms integer,
+    add column if not exists trace_id text;
+
+create table if not exists public.trace_spans (
+    id bigint generated always as identity primary key,
+    trace_id text,
+    stage text not null,
+    model text,
+    tag text,
+    duration_ms integer not null,
+    created_at timestamptz not null default now()
+);
+
+create index if not exists trace_spans_created_at_idx on public.trace_spans (created_at);
+create index if not exists aiusage_created_at_idx on public.aiusage (created_at);
+
+alter table public.trace_spans enable row level security;
+
+-- p50/p95/p99 since p_since, in milliseconds:
+--   metric 'ttft' and 'latency': LLM calls from aiusage, per model
+--   metric 'stage': spans from trace_spans, per stage and model
+create or replace function public.latency_percentiles(p_since timestamptz)
+returns table (
+    metric text, stage text, model text, samples bigint,
+    p50 double precision, p95 double precision, p99 double precision
+)
+language sql
+stable
+security definer
+set search_path = public
+as $$
+    select 'ttft', null, a.model, count(*),
+           percentile_cont(0.50) within group (order by a.ttft_ms),
+           percentile_cont(0.95) within group (order by a.ttft_ms),
+           percentile_cont(0.99) within group (order by a.ttft_ms)
+      from aiusage a
+     where a.created_at >= p_since and a.ttft_ms is not null
+     group by a.model
+    union all
+    select 'latency', null, a.model, count(*),
+           percentile_cont(0.50) within group (order by a.latency_ms),
+           percentile_cont(0.95) within group (order by a.latency_ms),
+           percentile_cont(0.99) within group (order by a.latency_ms)
+      from aiusage a
+     where a.created_at >= p_since and a.latency_ms is not null
+     group by a.model
+    union all
+    select 'stage', s.stage, s.model, count(*),
+           percentile_cont(0.50) within group (order by s.duration_ms),
+           percentile_cont(0.95) within group (order by s.duration_ms),
+           percentile_cont(0.99) within group (order by s.duration_ms)
+      from trace_spans s
+     where s.created_at >= p_since
+     group by s.stage, s.model;
+$$;
@@ -0,0 +1,6 @@
+-- Transcript compaction.
+-- raw_input_tokens: local estimate of the request's input before compaction
+-- compacted_input_tokens: the same estimate after it (equal when the input was not compacted)
+alter table public.aiusage
+    add column if not exists raw_input_tokens integer,
+    add column if not exists compacted_input_tokens integer;
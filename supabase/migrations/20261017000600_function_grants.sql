@@ -0,0 +1,18 @@
+-- Credit and profile functions run as security definer, so whoever may
+-- execute them can change any user's credits. Postgres grants execute to
+-- PUBLIC by default and Supabase to anon and authenticated, which would
+-- let anyone call them through PostgREST with the public anon key.
+-- Only the service role, used by the Streamlit app and the webhook
+-- service, may call them.
+
+revoke execute on function public.deduct_credits(text, integer) from public, anon, authenticated;
+revoke execute on function public.add_credits(text, integer) from public, anon, authenticated;
+revoke execute on function public.bootstrap_user(text, text) from public, anon, authenticated;
+revoke execute on function public.apply_stripe_event(text, text, text, integer) from public, anon, authenticated;
+revoke execute on function public.latency_percentiles(timestamptz) from public, anon, authenticated;
+
+grant execute on function public.deduct_credits(text, integer) to service_role;
+grant execute on function public.add_credits(text, integer) to service_role;
+grant execute on function public.bootstrap_user(text, text) to service_role;
+grant execute on function public.apply_stripe_event(text, text, text, integer) to service_role;
+grant execute on function public.latency_percentiles(timestamptz) to service_role;
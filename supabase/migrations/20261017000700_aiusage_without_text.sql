@@ -0,0 +1,6 @@
+-- aiusage keeps counts and timings only: the app no longer writes the note
+-- or the summary, so their columns must accept rows without them.
+-- Rows written before this change still hold text; see DEPLOYMENT.md to clear it.
+alter table public.aiusage
+    alter column input_text drop not null,
+    alter column ai_output_text drop not null;
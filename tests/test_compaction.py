@@ -0,0 +1,53 @@
+import pytest
+from components.compaction import compact_transcript
+
+# Clinical content that must come out of compaction word for word
+CLINICAL = [
+    "He went to the ER last night.",
+    "Which side hurts? Right.",
+    "Comment allez-vous? Très bien.",
+    "Does it get better or worse? Worse at night. Worse at night, yes.",
+    "Is it worse at night? Worse at night.",
+    "Any chest pain? No.",
+    "OK. Take 5 mg twice a day.",
+    "Prend amlodipine 5 mg 5 mg le matin.",
+    "Good. The swelling went down.",
+    "Well, the pain started on Monday.",
+    "Alors, la douleur est à droite.",
+    "D'accord. Vous prenez du Ventolin.",
+    "Any chest pain? Uh-uh.",
+    "Uh-huh.",
+    "Mm-hmm.",
+    "Tu vois bien de cet oeil?",
+    "Do you know your blood type?",
+    "I mean the left knee, not the right.",
+    "Vision is twenty twenty.",
+    "Tension à douze douze.",
+    "Vous vous êtes blessé?",
+    "Nous nous sommes vus lundi.",
+]
+
+@pytest.mark.parametrize("text", CLINICAL)
+def test_clinical_phrases_survive(text):
+    assert compact_transcript(text) == text
+
+@pytest.mark.parametrize("text, expected", [
+    ("Euh, I have, um, a headache.", "I have a headache."),
+    ("J'ai euh mal à la tête.", "J'ai mal à la tête."),
+    ("It started, you know, on Monday.", "It started on Monday."),
+    ("You know, it hurts at night.", "It hurts at night."),
+    ("Ça fait mal. Tu vois, ici.", "Ça fait mal. Ici."),
+    ("I have hyper- hypertension.", "I have hypertension."),
+    ("Je je je prends du Ventolin.", "Je prends du Ventolin."),
+    ("Bonjour docteur. Bonjour. J'ai mal au dos.", "Bonjour docteur. J'ai mal au dos."),
+    ("Thank you. Goodbye.", ""),
+    ("Merci beaucoup, au revoir.", ""),
+])
+def test_disfluencies_removed(text, expected):
+    assert compact_transcript(text) == expected
+
+def test_numbers_never_deduplicated():
+    assert compact_transcript("Blood pressure 120 120 over 80.") == "Blood pressure 120 120 over 80."
+
+def test_line_breaks_kept():
+    assert compact_transcript("Euh, bonjour.\nJ'ai mal.\n\nDepuis lundi.") == "J'ai mal.\nDepuis lundi."
@@ -0,0 +1,76 @@
+import numpy as np
+import av
+import pytest
+from components.live_transcription import (
+    BYTES_PER_SECOND, LIVE_SESSION_CREDITS, FrameConverter, LocalRealtimeBackend, start_live_session
+)
+
+WEBRTC_RATE = 48000
+FRAME_SAMPLES = 960  # 20 ms, what browsers send
+
+def _webrtc_frames(seconds):
+    """Stereo 48 kHz s16 frames, as streamlit-webrtc hands them over"""
+    t = np.arange(int(seconds * WEBRTC_RATE)) / WEBRTC_RATE
+    tone = (0.3 * np.sin(2 * np.pi * 440 * t) * 32767).astype(np.int16)
+    frames = []
+    for start in range(0, len(tone), FRAME_SAMPLES):
+        chunk = tone[start:start + FRAME_SAMPLES]
+        interleaved = np.repeat(chunk, 2).reshape(1, -1)
+        frame = av.AudioFrame.from_ndarray(interleaved, format="s16", layout="stereo")
+        frame.sample_rate = WEBRTC_RATE
+        frame.pts = start
+        frames.append(frame)
+    return frames
+
+def test_frames_are_converted_to_16k_mono():
+    pcm = FrameConverter().convert(_webrtc_frames(1.0))
+    # The resampler may hold back a few ms
+    assert len(pcm) == pytest.approx(BYTES_PER_SECOND, abs=BYTES_PER_SECOND // 20)
+    assert len(pcm) % 2 == 0
+
+def test_local_backend_releases_turns_as_audio_arrives():
+    backend = LocalRealtimeBackend(script=["Bonjour.", "J'ai mal au dos.", "Depuis lundi."], seconds_per_turn=1.0)
+    backend.start()
+    converter = FrameConverter()
+    frames = _webrtc_frames(2.5)
+    per_batch = len(frames) // 5  # Half a second per batch, like audio_receiver.get_frames
+
+    texts = []
+    for start in range(0, len(frames), per_batch):
+        backend.send_audio(converter.convert(frames[start:start + per_batch]))
+        texts.append(backend.text)
+
+    assert texts[0] == ""
+    assert texts[2] == "Bonjour."
+    assert backend.text == "Bonjour. J'ai mal au dos."
+    assert backend.stop() == "Bonjour. J'ai mal au dos."
+
+@pytest.fixture(scope="module")
+def fake_backends():
+    """Supabase and the secrets replaced by the benchmark fakes, with the local backend"""
+    from benchmarks.fakes import BackendConfig, Latency, install
+    database, _ = install(BackendConfig(supabase_latency=Latency(), llm_first_token=Latency()),
+                          secrets={"LIVE_TRANSCRIPTION_BACKEND": "local"})
+    from components.user_session import bootstrap_user_session
+    session = bootstrap_user_session()
+    return database, session.email
+
+def _credit(database, email):
+    return next(row["credit"] for row in database.tables["prompts"] if row["email"] == email)
+
+def test_live_session_takes_one_credit(fake_backends):
+    database, email = fake_backends
+    before = _credit(database, email)
+    backend = start_live_session(email)
+    assert isinstance(backend, LocalRealtimeBackend)
+    assert _credit(database, email) == before - LIVE_SESSION_CREDITS
+
+def test_live_session_that_fails_to_start_is_free(fake_backends, monkeypatch):
+    database, email = fake_backends
+    before = _credit(database, email)
+
+    def refuse(self):
+        raise ConnectionError("Websocket refused")
+    monkeypatch.setattr(LocalRealtimeBackend, "start", refuse)
+    assert start_live_session(email) is None
+    assert _credit(database, email) == before
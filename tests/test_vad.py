@@ -0,0 +1,85 @@
+import io
+import wave
+import numpy as np
+import pytest
+from components.audio import TARGET_RATE
+from components.vad import HANGOVER_MS, LEAD_IN_MS, TimeMap, trim_silence
+
+# Frame boundaries and rounding to whole ms
+TOLERANCE_MS = 100
+
+def _noise(seconds, db, rng):
+    return rng.normal(0, 32768 * 10 ** (db / 20), int(seconds * TARGET_RATE))
+
+def _speech(seconds, db, rng):
+    """Noise modulated like syllables, at about db dBFS RMS"""
+    t = np.arange(int(seconds * TARGET_RATE)) / TARGET_RATE
+    envelope = 0.6 + 0.4 * np.sin(2 * np.pi * 4 * t)
+    return _noise(seconds, db, rng) * envelope / np.sqrt(np.mean(envelope ** 2))
+
+def _wav(parts):
+    samples = np.clip(np.concatenate(parts), -32768, 32767).astype(np.int16)
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(TARGET_RATE)
+        f.writeframes(samples.tobytes())
+    buffer.seek(0)
+    return buffer
+
+def test_quiet_speech_is_kept():
+    """Speech only 7 dB above the room noise, between long pauses"""
+    rng = np.random.default_rng(0)
+    room, voice = -50, -43
+    source = _wav([_noise(3, room, rng), _speech(4, voice, rng), _noise(6, room, rng),
+                   _speech(4, voice, rng), _noise(3, room, rng)])
+    audio, time_map = trim_silence(source)
+    # All 8 s of speech, plus at most the hangover and lead-in of each pause
+    assert len(audio) >= 8000
+    assert len(audio) <= 8000 + 3 * (HANGOVER_MS + LEAD_IN_MS) + TOLERANCE_MS
+    assert len(audio) + time_map.removed_ms == pytest.approx(20000, abs=TOLERANCE_MS)
+
+def test_sound_at_the_start_is_kept():
+    """A steady sound from the first frame does not become the noise floor"""
+    rng = np.random.default_rng(1)
+    source = _wav([_noise(3, -30, rng), _noise(10, -60, rng), _speech(3, -35, rng)])
+    audio, time_map = trim_silence(source)
+    assert time_map.to_original(0) == 0
+    assert len(audio) >= 6000
+    samples = np.array(audio.get_array_of_samples())
+    head = samples[:3 * TARGET_RATE].astype(np.float64)
+    assert 20 * np.log10(np.sqrt(np.mean(head ** 2)) / 32768) > -33
+
+def test_short_pauses_are_kept():
+    rng = np.random.default_rng(2)
+    source = _wav([_speech(2, -30, rng), _noise(1.5, -60, rng), _speech(2, -30, rng)])
+    audio, time_map = trim_silence(source)
+    assert time_map.cuts == []
+    assert len(audio) == pytest.approx(5500, abs=TOLERANCE_MS)
+
+def test_time_map_points_back_to_the_recording():
+    rng = np.random.default_rng(3)
+    source = _wav([_speech(2, -30, rng), _noise(10, -60, rng), _speech(2, -30, rng), _noise(5, -60, rng)])
+    audio, time_map = trim_silence(source)
+    # One cut in the middle pause, one for the trailing quiet
+    assert len(time_map.cuts) == 2
+    middle_cut, _ = time_map.cuts[0]
+    assert middle_cut == pytest.approx(2000 + HANGOVER_MS, abs=TOLERANCE_MS)
+    # The second burst starts LEAD_IN_MS after the cut in the trimmed audio, at 12 s in the recording
+    assert time_map.to_original(middle_cut + LEAD_IN_MS) == pytest.approx(12000, abs=TOLERANCE_MS)
+    assert time_map.to_original(1000) == 1000
+    assert len(audio) + time_map.removed_ms == pytest.approx(19000, abs=TOLERANCE_MS)
+
+def test_empty_recording():
+    audio, time_map = trim_silence(_wav([np.zeros(0)]))
+    assert len(audio) == 0
+    assert time_map.removed_ms == 0
+
+def test_time_map_to_original():
+    time_map = TimeMap([(1000, 2000), (3000, 5000)])
+    assert time_map.removed_ms == 5000
+    assert time_map.to_original(500) == 500
+    assert time_map.to_original(1000) == 3000
+    assert time_map.to_original(2999) == 4999
+    assert time_map.to_original(3500) == 8500
@@ -0,0 +1,70 @@
+"""Send Stripe-signed fixture events to a local webhook service
+
+    python webhook_fixtures/send_webhook.py webhook_fixtures/checkout_session_completed.json \
+        --email someone@example.com --repeat 20
+
+Payloads are signed with STRIPE_WEBHOOK_SECRET the way Stripe signs them,
+so the service verifies them like real deliveries. --repeat sends the same
+event concurrently, as a burst of redeliveries: credits must be added once.
+--new-id gives the event a fresh id, for a grant that is not a duplicate.
+"""
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import time
+import uuid
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv()
+
+def sign_payload(payload, secret, timestamp=None):
+    """Stripe-Signature header for a payload: t=<timestamp>,v1=<HMAC-SHA256 of "t.payload">"""
+    timestamp = int(timestamp or time.time())
+    signature = hmac.new(secret.encode("utf-8"), f"{timestamp}.{payload}".encode("utf-8"), hashlib.sha256).hexdigest()
+    return f"t={timestamp},v1={signature}"
+
+def load_event(path, email=None, new_id=False):
+    with open(path, encoding="utf-8") as f:
+        event = json.load(f)
+    if email:
+        event["data"]["object"]["metadata"]["user_email"] = email
+        event["data"]["object"]["customer_email"] = email
+    if new_id:
+        event["id"] = f"evt_test_{uuid.uuid4().hex}"
+    return event
+
+async def send(url, event, secret, repeat=1):
+    payload = json.dumps(event)
+    async with httpx.AsyncClient(timeout=30) as client:
+        responses = await asyncio.gather(*(
+            client.post(url, content=payload, headers={
+                "Content-Type": "application/json",
+                "Stripe-Signature": sign_payload(payload, secret),
+            })
+            for _ in range(repeat)
+        ))
+    for response in responses:
+        print(response.status_code, response.text)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("fixture", help="Event JSON file")
+    parser.add_argument("--url", default="http://localhost:8000/stripe/webhook")
+    parser.add_argument("--secret", default=os.environ.get("STRIPE_WEBHOOK_SECRET"))
+    parser.add_argument("--email", help="User to credit, instead of the fixture's")
+    parser.add_argument("--new-id", action="store_true", help="Use a fresh event id")
+    parser.add_argument("--repeat", type=int, default=1, help="Concurrent deliveries of the same event")
+    args = parser.parse_args()
+    if not args.secret:
+        parser.error("Set STRIPE_WEBHOOK_SECRET or pass --secret")
+
+    event = load_event(args.fixture, args.email, args.new_id)
+    print(f"Sending {event['type']} {event['id']} x{args.repeat} to {args.url}")
+    asyncio.run(send(args.url, event, args.secret, args.repeat))
+
+if __name__ == "__main__":
+    main()
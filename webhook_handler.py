@@ -1,28 +1,108 @@
+"""Stripe webhook service granting purchased credits
+
+Standalone ASGI app, run next to the Streamlit app:
+
+    uvicorn webhook_handler:app --host 0.0.0.0 --port 8000
+
+Reads STRIPE_WEBHOOK_SECRET, SUPABASE_URL and SUPABASE_KEY from the
+environment (or a .env file). Every event id is recorded by the
+apply_stripe_event database function together with the credit grant, so
+redeliveries and replays never add credits twice.
+"""
+import json
+import os
+from contextlib import asynccontextmanager
 import stripe
-import streamlit as st
-from components.available_credits import add_credits
-
-def handle_successful_payment(event):
-    """Handle successful payment webhook event"""
-    session = event.data.object
-    user_email = session.metadata.get('user_email')
-    
-    if user_email:
-        success, message = add_credits(user_email, 300)
-        if not success:
-            # Log the error for admin review
-            print(f"Failed to add credits for {user_email}: {message}")
-            return False
-        return True
-    return False
+from dotenv import load_dotenv
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+from supabase import acreate_client
+
+load_dotenv()
+
+CREDITS_PER_PURCHASE = 300
+
+# Card payments are paid when the session completes, delayed methods
+# (bank debits) confirm later with async_payment_succeeded
+PAYMENT_EVENTS = {"checkout.session.completed", "checkout.session.async_payment_succeeded"}
 
 def verify_webhook_signature(payload, sig_header, webhook_secret):
-    """Verify that the webhook came from Stripe"""
+    """Verify that the webhook came from Stripe
+    Args:
+        payload: raw request body, as sent by Stripe
+    Returns:
+        dict or None: the event, or None if the signature is invalid or too old
+    """
     try:
-        stripe.Webhook.construct_event(
-            payload, sig_header, webhook_secret
+        stripe.WebhookSignature.verify_header(
+            payload, sig_header, webhook_secret, tolerance=stripe.Webhook.DEFAULT_TOLERANCE
         )
-        return True
+        return json.loads(payload)
     except Exception as e:
-        print(f"Webhook signature verification failed: {str(e)}")
-        return False
+        print(f"Webhook signature verification failed: {str(e)}")  # For server-side logging
+        return None
+
+async def handle_successful_payment(client, event):
+    """Grant the credits of a paid checkout session, once per event
+    Args:
+        client: async Supabase client
+    Returns:
+        tuple: (bool, str) - (credits granted, message)
+    """
+    session = event["data"]["object"]
+    if session.get("payment_status") != "paid":
+        return False, "Payment not completed yet"
+
+    user_email = (session.get("metadata") or {}).get("user_email") or session.get("customer_email")
+    if not user_email:
+        return False, "No user email in checkout session"
+
+    result = await client.rpc("apply_stripe_event", {
+        "p_event_id": event["id"],
+        "p_event_type": event["type"],
+        "p_email": user_email,
+        "p_amount": CREDITS_PER_PURCHASE,
+    }).execute()
+
+    if result.data is None:
+        return False, f"Event {event['id']} already processed"
+    return True, f"Credits added for {user_email}. New balance: {result.data}"
+
+async def stripe_webhook(request):
+    payload = await request.body()
+    event = verify_webhook_signature(
+        payload, request.headers.get("stripe-signature"), request.app.state.webhook_secret
+    )
+    if event is None:
+        return JSONResponse({"error": "Invalid signature"}, status_code=400)
+
+    if event.get("type") not in PAYMENT_EVENTS:
+        return JSONResponse({"received": True})
+
+    try:
+        granted, message = await handle_successful_payment(request.app.state.supabase, event)
+    except Exception as e:
+        # Nothing was recorded: a non-2xx answer makes Stripe deliver the event again
+        print(f"Failed to process event {event.get('id')}: {str(e)}")  # For server-side logging
+        return JSONResponse({"error": "Processing failed"}, status_code=500)
+
+    print(message)  # For server-side logging
+    return JSONResponse({"received": True, "granted": granted})
+
+async def health(request):
+    return JSONResponse({"status": "ok"})
+
+@asynccontextmanager
+async def lifespan(app):
+    app.state.webhook_secret = os.environ["STRIPE_WEBHOOK_SECRET"]
+    app.state.supabase = await acreate_client(os.environ["SUPABASE_URL"], os.environ["SUPABASE_KEY"])
+    yield
+
+app = Starlette(
+    routes=[
+        Route("/stripe/webhook", stripe_webhook, methods=["POST"]),
+        Route("/health", health),
+    ],
+    lifespan=lifespan,
+)